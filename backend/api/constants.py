@@ -26,10 +26,92 @@ COOKING_TIME_MAX_VALUE = 180
 """Максимальное время готовки."""
 INGREDIENTS_MIN_AMOUNT = 1
 """Минимальное количество ингредиентов."""
+SEARCH_CONFIG = 'russian'
+"""Конфигурация полнотекстового поиска PostgreSQL."""
 PAGE_SIZE = 6
 """Количество рецептов на странице."""
 PAGE_SIZE_MAX = 60
 """Максимальное оличество рецептов на странице."""
+RECIPES_LIMIT_MAX = 60
+"""Максимальное количество рецептов автора в списке подписок."""
+INGREDIENT_SEARCH_LIMIT = 50
+"""Максимальное количество ингредиентов в результатах поиска."""
+BULK_RECIPES_MAX = 100
+"""Максимальное количество рецептов в одной пакетной операции."""
+TRENDING_WINDOW_DAYS = 14
+"""За сколько последних дней учитываются действия в рейтинге популярных."""
+TRENDING_HALF_LIFE_HOURS = 48
+"""Время в часах, за которое вклад действия в рейтинг убывает вдвое."""
+TRENDING_WEIGHTS = {'favorite': 1.0, 'shopping_cart': 1.5}
+"""Вес добавления рецепта в избранное и в корзину в рейтинге."""
+TRENDING_SIZE = 1000
+"""Количество рецептов в рейтинге популярных."""
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+"""Максимум подписчиков автора, при котором рецепт раскладывается по лентам."""
+FEED_BACKFILL_SIZE = 100
+"""Сколько последних рецептов автора попадает в ленту при подписке."""
+SEED_ZIPF_EXPONENT = 1.1
+"""Показатель степенного распределения авторов и рецептов в seed_data."""
+SEED_ACTIVITY_ALPHA = 2.0
+"""Параметр распределения Парето для активности пользователей seed_data."""
+SEED_MAX_AGE_DAYS = 90
+"""За сколько последних дней seed_data создаёт избранное и корзины."""
+SQL_REPEAT_THRESHOLD = 5
+"""Сколько повторов одного SQL за запрос считается проблемой N+1."""
+RECIPE_ORDERING_CHOICES = (
+    ('popular', 'По популярности'),
+)
+"""Варианты сортировки списка рецептов."""
+RECIPE_ETAG_FIELDS = (
+    'version',
+    'updated_at',
+    'is_favorited',
+    'is_in_shopping_cart',
+    'is_subscribed',
+    'author__email',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'author__avatar',
+    'author__avatar_variants',
+)
+"""Поля, от которых зависит ETag рецепта для пользователя."""
+RESPONSE_CACHE_TIMEOUT = 300
+"""Время хранения в кэше ответов для анонимных пользователей в секундах."""
+ESTIMATED_COUNT_THRESHOLD = 10000
+"""Размер таблицы, начиная с которого админка оценивает число строк."""
+REFERENCE_MAX_AGE = 60
+"""Время в секундах, в течение которого клиент не перепроверяет справочники."""
+SHOPPING_LIST_CHUNK_SIZE = 2000
+"""Количество строк, читаемых за раз при выгрузке списка покупок."""
+SHOPPING_LIST_STREAM_BUFFER = 8192
+"""Размер порции потоковой выдачи файла списка покупок в символах."""
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+"""Время хранения готового файла списка покупок в кэше в секундах."""
+RECIPE_IMAGE_VARIANTS = {
+    'card': (480, 320, True),
+    'detail': (1200, 900, False),
+}
+"""Варианты фото рецепта: ширина, высота и нужна ли обрезка по размеру."""
+AVATAR_VARIANTS = {
+    'avatar': (160, 160, True),
+}
+"""Варианты аватара: ширина, высота и нужна ли обрезка по размеру."""
+IMAGE_VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+"""Форматы вариантов изображений и параметры их сохранения в Pillow."""
+IMAGE_WORKERS = 2
+"""Количество фоновых потоков обработки изображений в процессе."""
+MEDIA_HASH_CHUNK_SIZE = 64 * 1024
+"""Размер блока при вычислении хеша содержимого медиафайла."""
+IMAGE_MAX_SIZE = 10 * 1024 * 1024
+"""Максимальный размер загружаемого изображения в байтах."""
+IMAGE_MAX_SIDE = 6000
+"""Максимальная ширина и высота загружаемого изображения в пикселях."""
+BASE64_CHUNK_SIZE = 64 * 1024
+"""Размер блока при декодировании base64, кратный четырём."""
 
 LOGIN_ERROR_MESSAGE = (
     'Логин может содержать только английские '
@@ -74,3 +156,21 @@ SUBSCRIBE_NOT_EXIST_ER_MESSAGE = (
     'Вы не подписаны на этого пользователя.'
 )
 """Сообщение при отсутствии подписки."""
+
+RECIPES_LIMIT_ER_MESSAGE = (
+    'recipes_limit должен быть целым числом от 1 до {max_value}.'
+)
+"""Сообщение при некорректном значении recipes_limit."""
+
+IMAGE_SIZE_ER_MESSAGE = (
+    'Размер изображения не должен превышать {max_size} МБ.'
+)
+"""Сообщение при превышении размера изображения."""
+
+IMAGE_SIDE_ER_MESSAGE = (
+    'Ширина и высота изображения не должны превышать {max_side} пикселей.'
+)
+"""Сообщение при превышении размеров изображения."""
+
+MULTIPART_JSON_ER_MESSAGE = 'Поле {field} должно содержать корректный JSON.'
+"""Сообщение при некорректном JSON в поле multipart-формы."""
@@ -1,16 +1,122 @@
 import base64
+import binascii
 
-from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
 from rest_framework import serializers
 
+from .constants import (BASE64_CHUNK_SIZE, IMAGE_MAX_SIDE, IMAGE_MAX_SIZE,
+                        IMAGE_SIDE_ER_MESSAGE, IMAGE_SIZE_ER_MESSAGE,
+                        IMAGE_VARIANT_FORMATS)
+
+
+class DecodedImageFile(TemporaryUploadedFile):
+    """Временный файл с изображением, декодированным из base64.
+
+    В отличие от файлов из multipart-формы он не закрывается вместе
+    с запросом, поэтому закрывается при удалении объекта.
+    """
+
+    def __del__(self):
+        self.close()
+
 
 class Base64ImageField(serializers.ImageField):
-    """Поле для сериализации изображений."""
+    """Поле для сериализации изображений.
+
+    Принимает файл из multipart-формы или строку data:image;base64.
+    Строка декодируется блоками во временный файл, а размер и габариты
+    проверяются до полной проверки изображения.
+    """
+
+    default_error_messages = {
+        'max_size': IMAGE_SIZE_ER_MESSAGE.format(
+            max_size=IMAGE_MAX_SIZE // (1024 * 1024)
+        ),
+        'max_side': IMAGE_SIDE_ER_MESSAGE.format(max_side=IMAGE_MAX_SIDE),
+    }
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
+            data = self.decode(data)
+        if hasattr(data, 'size'):
+            self.check_limits(data)
         return super().to_internal_value(data)
+
+    def decode(self, data):
+        format, _, imgstr = data.partition(';base64,')
+        if len(imgstr) // 4 * 3 > IMAGE_MAX_SIZE:
+            self.fail('max_size')
+        ext = format.split('/')[-1]
+        file = DecodedImageFile(
+            'temp.' + ext, format.partition(':')[2], 0, None
+        )
+        # Пробельные символы (например, переносы строк MIME) удаляются,
+        # а неполная четвёрка символов переносится в следующий блок.
+        pending = ''
+        try:
+            for start in range(0, len(imgstr), BASE64_CHUNK_SIZE):
+                chunk = pending + ''.join(
+                    imgstr[start:start + BASE64_CHUNK_SIZE].split()
+                )
+                end = len(chunk) - len(chunk) % 4
+                file.write(base64.b64decode(chunk[:end]))
+                pending = chunk[end:]
+            if pending:
+                file.write(base64.b64decode(pending))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_image')
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+    def check_limits(self, file):
+        if file.size > IMAGE_MAX_SIZE:
+            self.fail('max_size')
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except Exception:
+            return
+        finally:
+            file.seek(0)
+        if max(width, height) > IMAGE_MAX_SIDE:
+            self.fail('max_side')
+
+
+class ImageVariantsField(serializers.Field):
+    """Поле со ссылками на уменьшенные варианты изображения.
+
+    Пока варианты не готовы, вместо них отдаётся ссылка на оригинал.
+    """
+
+    def __init__(self, image_field, variants_field, variants, **kwargs):
+        self.image_field = image_field
+        self.variants_field = variants_field
+        self.variants = variants
+        kwargs.setdefault('source', '*')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        image = getattr(instance, self.image_field)
+        if not image:
+            return None
+        stored = getattr(instance, self.variants_field)
+        if stored.get('source') != image.name:
+            stored = {}
+        request = self.context.get('request')
+        build_url = request.build_absolute_uri if request else str
+        original = build_url(image.url)
+        return {
+            variant: {
+                extension: (
+                    build_url(default_storage.url(stored[variant][extension]))
+                    if variant in stored else original
+                )
+                for extension in IMAGE_VARIANT_FORMATS
+            }
+            for variant in self.variants
+        }
@@ -1,19 +1,11 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db.models import F, Q
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Recipe, Tag
 
-
-class IngredientFilter(FilterSet):
-    """Класс фильтрации по названию ингредиентов."""
-
-    name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='istartswith'
-    )
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+from .constants import RECIPE_ORDERING_CHOICES, SEARCH_CONFIG
 
 
 class RecipeFilter(FilterSet):
@@ -28,10 +20,17 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=RECIPE_ORDERING_CHOICES, method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'tags')
+        fields = (
+            'author', 'is_favorited', 'is_in_shopping_cart', 'tags', 'search',
+            'ordering',
+        )
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated:
@@ -51,3 +50,24 @@ class RecipeFilter(FilterSet):
         if value and user:
             return queryset.filter(shopping_cart__user_id=user.id)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            search_similarity=TrigramSimilarity('name', value),
+        ).filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        ).order_by('-search_rank', '-search_similarity', '-id')
+
+    def filter_ordering(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by(
+                '-favorites_count', '-in_carts_count', '-id'
+            )
+        return queryset
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+
+from .constants import (AVATAR_VARIANTS, IMAGE_VARIANT_FORMATS, IMAGE_WORKERS,
+                        RECIPE_IMAGE_VARIANTS)
+from .versions import RECIPES_VERSION_KEY, bump_version
+
+User = get_user_model()
+
+executor = ThreadPoolExecutor(
+    max_workers=IMAGE_WORKERS, thread_name_prefix='images'
+)
+"""Пул потоков, в котором изображения обрабатываются вне цикла запроса."""
+
+
+def resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.LANCZOS)
+    return image
+
+
+def build_variants(field_file, variants):
+    """Создаёт варианты изображения и возвращает пути к ним в хранилище."""
+    directory = PurePosixPath(field_file.field.upload_to) / 'variants'
+    with field_file.open('rb') as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        result = {'source': field_file.name}
+        for variant, (width, height, crop) in variants.items():
+            resized = resize(image, width, height, crop)
+            result[variant] = {}
+            for extension, (image_format, options) in (
+                IMAGE_VARIANT_FORMATS.items()
+            ):
+                buffer = BytesIO()
+                resized.save(buffer, image_format, **options)
+                result[variant][extension] = default_storage.save(
+                    str(directory / f'{variant}.{extension}'),
+                    ContentFile(buffer.getvalue()),
+                )
+    return result
+
+
+def process_image(model, pk, image_field, variants_field, variants,
+                  **updates):
+    """Создаёт варианты изображения объекта и сохраняет их список.
+
+    Файлы хранятся по хешу содержимого, поэтому варианты уже
+    обработанного изображения берутся у другого объекта с тем же файлом.
+    Если за время обработки изображение заменили, результат отбрасывается.
+    Поля из updates обновляются вместе со списком вариантов.
+    """
+    instance = model.objects.filter(pk=pk).only(
+        image_field, variants_field
+    ).first()
+    if instance is None:
+        return
+    field_file = getattr(instance, image_field)
+    stored = getattr(instance, variants_field)
+    if not field_file or stored.get('source') == field_file.name:
+        return
+    result = model.objects.filter(
+        **{
+            image_field: field_file.name,
+            f'{variants_field}__source': field_file.name,
+        }
+    ).values_list(variants_field, flat=True).first()
+    if result is None:
+        result = build_variants(field_file, variants)
+    model.objects.filter(
+        pk=pk, **{image_field: field_file.name}
+    ).update(**{variants_field: result}, **updates)
+
+
+def process_recipe_image(pk):
+    process_image(
+        Recipe, pk, 'image', 'image_variants', RECIPE_IMAGE_VARIANTS,
+        version=F('version') + 1, updated_at=Now(),
+    )
+    bump_version(RECIPES_VERSION_KEY)
+
+
+def process_avatar(pk):
+    process_image(User, pk, 'avatar', 'avatar_variants', AVATAR_VARIANTS)
+    bump_version(RECIPES_VERSION_KEY)
+
+
+def run_task(task, pk):
+    """Выполняет обработку изображения в потоке пула.
+
+    Соединения потока закрываются только здесь: при вызове задачи
+    напрямую, например из команды, соединение вызывающего кода
+    с открытым курсором не должно закрываться.
+    """
+    close_old_connections()
+    try:
+        task(pk)
+    finally:
+        close_old_connections()
+
+
+def schedule(task, pk):
+    """Ставит обработку изображения в очередь после фиксации транзакции."""
+    transaction.on_commit(lambda: executor.submit(run_task, task, pk))
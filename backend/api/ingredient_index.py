@@ -0,0 +1,63 @@
+from bisect import bisect_left, bisect_right
+from heapq import nsmallest
+
+from recipes.models import Ingredient
+
+from .constants import INGREDIENT_SEARCH_LIMIT
+from .versions import INGREDIENTS_VERSION_KEY, get_version
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для поиска по началу названия.
+
+    Названия хранятся в отсортированном массиве в нижнем регистре,
+    поиск выполняется бинарным делением без обращения к базе данных.
+    Индекс перестраивается, когда меняется версия справочника ингредиентов.
+    """
+
+    def __init__(self):
+        self._state = None
+
+    def _load(self, version):
+        ingredients = list(
+            Ingredient.objects.values('id', 'name', 'measurement_unit')
+        )
+        entries = sorted(
+            (ingredient['name'].casefold(), ingredient['id'], ingredient)
+            for ingredient in ingredients
+        )
+        keys = [key for key, _, _ in entries]
+        items = [ingredient for _, _, ingredient in entries]
+        self._state = (version, ingredients, keys, items)
+        return self._state
+
+    def _get_state(self):
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        state = self._state
+        if state is None or state[0] != version:
+            state = self._load(version)
+        return state
+
+    def all(self):
+        """Возвращает все ингредиенты в порядке сортировки модели."""
+        _, ingredients, _, _ = self._get_state()
+        return ingredients
+
+    def search(self, prefix, limit=INGREDIENT_SEARCH_LIMIT):
+        """Возвращает ингредиенты, название которых начинается с prefix.
+
+        Первыми идут точные совпадения и более короткие названия.
+        """
+        _, _, keys, items = self._get_state()
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = bisect_right(keys, prefix + chr(0x10FFFF), start)
+        positions = nsmallest(
+            limit,
+            range(start, end),
+            key=lambda position: (len(keys[position]), position),
+        )
+        return [items[position] for position in positions]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,96 @@
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .constants import SQL_REPEAT_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCollector:
+    """Считает SQL-запросы запроса, их время и повторы одного SQL."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def get_repeated(self):
+        """Возвращает самый частый SQL и число его повторов."""
+        if not self.statements:
+            return None, 0
+        return self.statements.most_common(1)[0]
+
+
+def get_view_name(request):
+    """Имя представления вида RecipeViewSet.list или short_url."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '-'
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.func.__name__
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class SQLInstrumentationMiddleware:
+    """Промежуточный слой для замера SQL-запросов каждого запроса.
+
+    Включается настройкой SQL_INSTRUMENTATION; иначе Django исключает
+    его из цепочки при запуске. Добавляет заголовок Server-Timing
+    и пишет строку в лог с именем представления. Запросы, выполненные
+    при чтении потокового ответа, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        start = time.perf_counter()
+        with connection.execute_wrapper(collector):
+            response = self.get_response(request)
+        total = (time.perf_counter() - start) * 1000
+        db_time = collector.duration * 1000
+        repeated_sql, repeats = collector.get_repeated()
+        response['Server-Timing'] = (
+            f'db;dur={db_time:.1f};desc="{collector.count} queries", '
+            f'app;dur={total - db_time:.1f}, total;dur={total:.1f}'
+        )
+        view = get_view_name(request)
+        fields = {
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': collector.count,
+            'db_ms': round(db_time, 1),
+            'total_ms': round(total, 1),
+            'repeats': repeats,
+        }
+        message = ' '.join(f'{key}={value}' for key, value in fields.items())
+        if repeats >= SQL_REPEAT_THRESHOLD:
+            logger.warning(
+                '%s n_plus_one=%r', message, repeated_sql,
+                extra={'sql_stats': {**fields, 'repeated_sql': repeated_sql}},
+            )
+        else:
+            logger.info(message, extra={'sql_stats': fields})
+        return response
@@ -0,0 +1,96 @@
+from hashlib import md5
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .constants import REFERENCE_MAX_AGE, RESPONSE_CACHE_TIMEOUT
+from .versions import get_stamp, get_version
+
+
+class VersionedListMixin:
+    """Отдаёт список справочника с заголовками HTTP-кэширования.
+
+    ETag и Last-Modified берутся из версии справочника, поэтому ответ
+    304 формируется без обращения к базе данных. Тело ответа без
+    параметров запроса сериализуется один раз на версию и хранится
+    в памяти процесса.
+    """
+
+    version_key = None
+    _bodies = {}
+
+    def perform_authentication(self, request):
+        """Пользователь определяется лениво, только если он понадобится."""
+
+    def get_list_data(self, request):
+        return self.get_serializer(
+            self.filter_queryset(self.get_queryset()), many=True
+        ).data
+
+    def get_list_body(self, request, version):
+        if request.query_params:
+            return JSONRenderer().render(self.get_list_data(request))
+        cached = self._bodies.get(self.version_key)
+        if cached is None or cached[0] != version:
+            cached = (
+                version, JSONRenderer().render(self.get_list_data(request))
+            )
+            self._bodies[self.version_key] = cached
+        return cached[1]
+
+    def list(self, request, *args, **kwargs):
+        version, modified = get_stamp(self.version_key)
+        etag = f'"{version}"'
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(modified)
+        )
+        if response is None:
+            response = HttpResponse(
+                self.get_list_body(request, version),
+                content_type='application/json',
+            )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        patch_cache_control(
+            response, public=True, max_age=REFERENCE_MAX_AGE
+        )
+        return response
+
+
+class AnonymousCacheMixin:
+    """Кэширует данные ответов на GET-запросы анонимных пользователей.
+
+    Ключ строится из версии данных, адреса и упорядоченных параметров
+    запроса. Сигналы меняют версию при записи, и прежние ответы
+    перестают использоваться, поэтому подходит любой бэкенд кэша.
+    """
+
+    cache_version_key = None
+
+    def get_response_cache_key(self, request):
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        )
+        digest = md5(
+            repr((request.build_absolute_uri(request.path), params)).encode(),
+            usedforsecurity=False,
+        )
+        version = get_version(self.cache_version_key)
+        return f'response:{version}:{digest.hexdigest()}'
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, RESPONSE_CACHE_TIMEOUT)
+        return response
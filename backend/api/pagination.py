@@ -1,11 +1,236 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, Cursor,
+                                       CursorPagination, PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-from .constants import PAGE_SIZE, PAGE_SIZE_MAX
+from .constants import ESTIMATED_COUNT_THRESHOLD, PAGE_SIZE, PAGE_SIZE_MAX
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки, оценивающий размер большой таблицы.
+
+    Для выборки без условий количество строк берётся из статистики
+    планировщика PostgreSQL, если оно превышает порог; иначе
+    выполняется точный COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = %s::regclass',
+                    (self.object_list.model._meta.db_table,),
+                )
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
+
+
+class KeysetPagination(CursorPagination):
+    """Пагинатор по курсору без OFFSET и подсчёта общего количества."""
+    page_size = PAGE_SIZE
+    max_page_size = PAGE_SIZE_MAX
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    ordering = '-id'
 
 
 class CustomPagination(PageNumberPagination):
-    """Пагинатор для управления количеством элементов на странице."""
+    """Пагинатор для управления количеством элементов на странице.
+
+    Если в запросе передан параметр cursor (в том числе пустой),
+    пагинация выполняется по курсору с помощью KeysetPagination.
+    """
     page_size = PAGE_SIZE
     max_page_size = PAGE_SIZE_MAX
     page_size_query_param = 'limit'
     page_query_param = 'page'
+    keyset_pagination_class = KeysetPagination
+
+    keyset_paginator = None
+
+    def get_keyset_pagination_class(self, request):
+        return self.keyset_pagination_class
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_param = self.keyset_pagination_class.cursor_query_param
+        if cursor_param in request.query_params:
+            self.keyset_paginator = self.get_keyset_pagination_class(
+                request
+            )()
+            return self.keyset_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.keyset_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_paginator is not None:
+            return self.keyset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class PopularKeysetPagination(KeysetPagination):
+    """Пагинатор по курсору в порядке популярности рецептов.
+
+    CursorPagination хранит в курсоре только первое поле сортировки,
+    а рецепты с одинаковым числом добавлений листает через OFFSET.
+    Здесь курсор хранит все три поля, и страница выбирается сравнением
+    строк (favorites_count, in_carts_count, id) по индексу популярности.
+    """
+    ordering = ('-favorites_count', '-in_carts_count', '-id')
+    position_fields = ('favorites_count', 'in_carts_count', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+        self.reverse = cursor is not None and cursor.reverse
+        position = self.get_position_from_cursor(cursor)
+        if position is not None:
+            table = connection.ops.quote_name(queryset.model._meta.db_table)
+            columns = ', '.join(
+                f'{table}.{connection.ops.quote_name(field)}'
+                for field in self.position_fields
+            )
+            operator = '>' if self.reverse else '<'
+            queryset = queryset.filter(RawSQL(
+                f'({columns}) {operator} (%s, %s, %s)', position,
+                output_field=BooleanField(),
+            ))
+        if self.reverse:
+            queryset = queryset.order_by(*self.position_fields)
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def get_position_from_cursor(self, cursor):
+        if cursor is None or cursor.position is None:
+            return None
+        try:
+            position = [int(value) for value in cursor.position.split('.')]
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if len(position) != len(self.position_fields):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_position_from_instance(self, instance):
+        return '.'.join(
+            str(getattr(instance, field)) for field in self.position_fields
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False,
+            position=self.get_position_from_instance(self.page[-1]),
+        ))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True,
+            position=self.get_position_from_instance(self.page[0]),
+        ))
+
+
+class RecipePagination(CustomPagination):
+    """Пагинатор рецептов.
+
+    При сортировке по популярности курсор строится по тем же полям,
+    иначе KeysetPagination заменил бы её сортировкой по id.
+    """
+    popular_keyset_pagination_class = PopularKeysetPagination
+
+    def get_keyset_pagination_class(self, request):
+        if request.query_params.get('ordering') == 'popular':
+            return self.popular_keyset_pagination_class
+        return super().get_keyset_pagination_class(request)
+
+
+class TrendingKeysetPagination(KeysetPagination):
+    """Пагинатор по курсору в порядке рейтинга популярных рецептов."""
+    ordering = 'trend_rank'
+
+
+class TrendingPagination(CustomPagination):
+    """Пагинатор рейтинга популярных рецептов."""
+    keyset_pagination_class = TrendingKeysetPagination
+
+
+class FeedPagination(BasePagination):
+    """Пагинатор ленты подписок по id последнего показанного рецепта."""
+    page_size = PAGE_SIZE
+    max_page_size = PAGE_SIZE_MAX
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size < 1:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            cursor = int(cursor)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if cursor < 1:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def paginate_feed(self, feed, user, request):
+        """Возвращает id рецептов страницы ленты."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        recipe_ids = feed.get_recipe_ids(
+            user, self.get_cursor(request), page_size + 1
+        )
+        self.has_next = len(recipe_ids) > page_size
+        recipe_ids = recipe_ids[:page_size]
+        self.next_cursor = recipe_ids[-1] if recipe_ids else None
+        return recipe_ids
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor,
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
@@ -0,0 +1,30 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+from .constants import MULTIPART_JSON_ER_MESSAGE
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """Парсер multipart-формы с вложенными полями в виде строки JSON.
+
+    Имена таких полей задаются атрибутом multipart_json_fields
+    представления, файлы передаются отдельными частями формы.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        view = (parser_context or {}).get('view')
+        json_fields = getattr(view, 'multipart_json_fields', ())
+        data = {}
+        for field, value in result.data.items():
+            if field in json_fields:
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    raise ParseError(
+                        MULTIPART_JSON_ER_MESSAGE.format(field=field)
+                    )
+            data[field] = value
+        return DataAndFiles(data, result.files.dict())
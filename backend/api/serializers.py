@@ -1,15 +1,18 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingCartIngredient, Tag)
 from users.models import Subscription
 
-from .constants import (PAGE_SIZE, SUBSCRIBE_ER_MESSAGE,
+from .constants import (AVATAR_VARIANTS, BULK_RECIPES_MAX,
+                        RECIPE_IMAGE_VARIANTS, SUBSCRIBE_ER_MESSAGE,
                         SUBSCRIBE_EXIST_ER_MESSAGE)
-from .fields import Base64ImageField
+from .fields import Base64ImageField, ImageVariantsField
+from .utils import get_authors_recipes, get_recipes_limit, get_subscribed_ids
 
 User = get_user_model()
 
@@ -29,6 +32,9 @@ class CustomUserSerializer(UserSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(allow_null=True, required=False)
+    avatar_variants = ImageVariantsField(
+        'avatar', 'avatar_variants', AVATAR_VARIANTS
+    )
 
     class Meta:
         model = User
@@ -40,15 +46,11 @@ class CustomUserSerializer(UserSerializer):
             'last_name',
             'is_subscribed',
             'avatar',
+            'avatar_variants',
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return Subscription.objects.filter(
-            user=request.user,
-            author=obj).exists()
+        return obj.id in get_subscribed_ids(self.context.get('request'))
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -121,8 +123,13 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(
         source='ingredient_list', many=True
     )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    is_favorited = serializers.BooleanField(read_only=True, default=False)
+    is_in_shopping_cart = serializers.BooleanField(
+        read_only=True, default=False
+    )
+    image_variants = ImageVariantsField(
+        'image', 'image_variants', RECIPE_IMAGE_VARIANTS
+    )
 
     class Meta:
         model = Recipe
@@ -135,37 +142,17 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
 
-    def check_model_object(self, obj, model):
-        request = self.context.get('request')
-        user = request.user
-        return (
-            request
-            and user.is_authenticated
-            and model.objects.filter(
-                recipe=obj,
-                user=user
-            ).exists()
-        )
-
-    def get_is_favorited(self, obj):
-        return self.check_model_object(obj, Favorite)
-
-    def get_is_in_shopping_cart(self, obj):
-        return self.check_model_object(obj, ShoppingCart)
-
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для записи рецептов."""
 
     ingredients = RecipeIngredientWriteSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField(allow_null=True)
 
     class Meta:
@@ -189,7 +176,10 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise ValidationError('Укажите хотя бы один тэг')
         if len(value) != len(set(value)):
             raise ValidationError('Теги не должны повторяться')
-        return value
+        tags = Tag.objects.in_bulk(value)
+        if len(tags) != len(value):
+            raise ValidationError('Вы добавили несуществующие теги')
+        return [tags[tag_id] for tag_id in value]
 
     def validate_ingredients(self, value):
         if not value:
@@ -200,16 +190,23 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             if ingredient_id in ingredients_id:
                 raise ValidationError('Ингредиент уже добавлен')
             ingredients_id.append(ingredient_id)
-        real_ingredients_number = Ingredient.objects.filter(
-            id__in=ingredients_id).count()
-        if real_ingredients_number != len(ingredients_id):
+        ingredients = Ingredient.objects.in_bulk(ingredients_id)
+        if len(ingredients) != len(ingredients_id):
             raise ValidationError('Вы добавили несуществующие ингредиенты')
+        for ingredient in value:
+            ingredient['ingredient'] = ingredients[ingredient['id']]
         return value
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'ingredient_list__ingredient'
+        ).with_user_flags(
+            request.user if request else None
+        ).get(pk=instance.pk)
         serializer = RecipeReadSerializer(
             instance,
-            context={'request': self.context.get('request')}
+            context={'request': request}
         )
         return serializer.data
 
@@ -217,19 +214,59 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags)
 
     def create_recipe_ingredient(self, ingredients, recipe):
-        recipe_ingredients = []
-        for ingredient_data in ingredients:
-            ingredient_id = ingredient_data['id']
-            amount = ingredient_data['amount']
-            ingredient = Ingredient.objects.get(pk=ingredient_id)
-            one_ingredient = RecipeIngredient(
-                ingredient=ingredient,
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                ingredient=ingredient_data['ingredient'],
                 recipe=recipe,
-                amount=amount
+                amount=ingredient_data['amount']
             )
-            recipe_ingredients.append(one_ingredient)
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+            for ingredient_data in ingredients
+        )
 
+    def update_recipe_ingredient(self, ingredients, recipe):
+        """Приводит состав рецепта к переданному, меняя только отличия.
+
+        Если состав изменился, суммы в списках покупок пользователей,
+        добавивших рецепт в корзину, пересчитываются.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.ingredient_list.all()
+        }
+        new_amounts = {
+            ingredient_data['id']: ingredient_data['amount']
+            for ingredient_data in ingredients
+        }
+        to_delete = [
+            recipe_ingredient.id
+            for ingredient_id, recipe_ingredient in current.items()
+            if ingredient_id not in new_amounts
+        ]
+        to_update = []
+        for ingredient_id, amount in new_amounts.items():
+            recipe_ingredient = current.get(ingredient_id)
+            if recipe_ingredient and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                to_update.append(recipe_ingredient)
+        to_create = [
+            ingredient_data for ingredient_data in ingredients
+            if ingredient_data['id'] not in current
+        ]
+        if not (to_delete or to_update or to_create):
+            return
+        cart_user_ids = list(
+            recipe.shopping_cart.values_list('user_id', flat=True)
+        )
+        ShoppingCartIngredient.objects.remove_recipe(recipe, cart_user_ids)
+        if to_delete:
+            RecipeIngredient.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        if to_create:
+            self.create_recipe_ingredient(to_create, recipe)
+        ShoppingCartIngredient.objects.add_recipe(recipe, cart_user_ids)
+
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context['request']
         user = request.user
@@ -241,28 +278,35 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         )
         self.create_recipe_tag(tags, recipe)
         self.create_recipe_ingredient(ingredients, recipe)
+        Recipe.objects.filter(pk=recipe.pk).update_search_vector()
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.get('ingredients')
+        ingredients = validated_data.pop('ingredients', None)
         if ingredients is None:
             raise ValidationError({'ingredients': 'Добавьте ингридиенты'})
-        tags = validated_data.get('tags')
+        tags = validated_data.pop('tags', None)
         if tags is None:
             raise ValidationError({'tags': 'Добавьте тег'})
-        instance.tags.clear()
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.create_recipe_tag(validated_data.pop('tags'), instance)
-        self.create_recipe_ingredient(
-            validated_data.pop('ingredients'),
-            instance)
-        return super().update(instance, validated_data)
+        self.create_recipe_tag(tags, instance)
+        self.update_recipe_ingredient(ingredients, instance)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save_editable()
+        recipes = Recipe.objects.filter(pk=instance.pk)
+        recipes.update_search_vector()
+        recipes.touch()
+        return instance
 
 
 class RecipeSmallSerializer(serializers.ModelSerializer):
     """Упрощённый сериализатор для рецептов."""
 
     image = Base64ImageField()
+    image_variants = ImageVariantsField(
+        'image', 'image_variants', RECIPE_IMAGE_VARIANTS
+    )
 
     class Meta:
         model = Recipe
@@ -270,10 +314,24 @@ class RecipeSmallSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
 
 
+class RecipeIdListSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для пакетных операций."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_MAX,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
 class SubscriberDetailSerializer (serializers.ModelSerializer):
     """Сериализатор для информации о подписках."""
 
@@ -286,6 +344,9 @@ class SubscriberDetailSerializer (serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
     avatar = Base64ImageField(source='author.avatar')
+    avatar_variants = ImageVariantsField(
+        'avatar', 'avatar_variants', AVATAR_VARIANTS, source='author'
+    )
 
     class Meta:
         model = Subscription
@@ -299,26 +360,32 @@ class SubscriberDetailSerializer (serializers.ModelSerializer):
             'recipes',
             'recipes_count',
             'avatar',
+            'avatar_variants',
         )
 
+    def get_author_recipes(self, obj):
+        if 'author_recipes' not in self.context:
+            request = self.context.get('request')
+            self.context['author_recipes'] = get_authors_recipes(
+                (obj.author_id,), get_recipes_limit(request)
+            )
+        return self.context['author_recipes']
+
     def get_recipes_count(self, obj):
-        return getattr(obj, 'recipe_count', 0)
+        _, recipes_count = self.get_author_recipes(obj)
+        return recipes_count.get(obj.author_id, 0)
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        user = request.user
-        return Subscription.objects.filter(
-            author=obj.author,
-            user=user).exists()
+        return obj.author_id in get_subscribed_ids(
+            self.context.get('request')
+        )
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        limit = int(limit) if limit is not None else PAGE_SIZE
+        recipes, _ = self.get_author_recipes(obj)
         return RecipeSmallSerializer(
-            Recipe.objects.filter(author=obj.author)[:limit],
+            recipes.get(obj.author_id, ()),
             many=True,
-            context={'request': request}
+            context={'request': self.context.get('request')}
         ).data
 
 
@@ -0,0 +1,106 @@
+import csv
+import json
+
+from django.core.cache import cache
+from django.db.models import F
+
+from recipes.models import ShoppingCartIngredient
+
+from .constants import (SHOPPING_LIST_CACHE_TIMEOUT, SHOPPING_LIST_CHUNK_SIZE,
+                        SHOPPING_LIST_STREAM_BUFFER)
+
+
+class EchoBuffer:
+    """Псевдобуфер, возвращающий записанную строку вместо её хранения."""
+
+    def write(self, value):
+        return value
+
+
+def get_shopping_list(user):
+    """Возвращает итератор суммарного количества ингредиентов из корзины.
+
+    Суммы берутся из поддерживаемой таблицы ShoppingCartIngredient,
+    строки читаются с сервера базы данных порциями через курсор.
+    """
+    return (
+        ShoppingCartIngredient.objects.filter(user=user)
+        .values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            total_amount=F('amount'),
+        )
+        .order_by('ingredient__name')
+        .iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+    )
+
+
+def write_txt(ingredients):
+    for ingredient in ingredients:
+        yield (
+            f'{ingredient["ingredient__name"]} - '
+            f'({ingredient["ingredient__measurement_unit"]})'
+            f'— {ingredient["total_amount"]} \n'
+        )
+
+
+def write_csv(ingredients):
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['total_amount'],
+        ))
+
+
+def write_json(ingredients):
+    yield '['
+    separator = ''
+    for ingredient in ingredients:
+        yield separator + json.dumps(
+            {
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['total_amount'],
+            },
+            ensure_ascii=False,
+        )
+        separator = ','
+    yield ']'
+
+
+WRITERS = {
+    'txt': write_txt,
+    'csv': write_csv,
+    'json': write_json,
+}
+"""Функции записи списка покупок по форматам файла."""
+
+
+def get_cache_key(user_id, version, file_format):
+    return f'shopping-list:{user_id}:{version}:{file_format}'
+
+
+def stream_shopping_list(user, file_format, cache_key):
+    """Отдаёт файл списка покупок порциями и сохраняет его в кэш.
+
+    Файл попадает в кэш только после того, как был выдан полностью.
+    """
+    parts = []
+    buffer = []
+    buffer_size = 0
+    for line in WRITERS[file_format](get_shopping_list(user)):
+        buffer.append(line)
+        buffer_size += len(line)
+        if buffer_size >= SHOPPING_LIST_STREAM_BUFFER:
+            chunk = ''.join(buffer).encode('utf-8')
+            parts.append(chunk)
+            buffer = []
+            buffer_size = 0
+            yield chunk
+    chunk = ''.join(buffer).encode('utf-8')
+    parts.append(chunk)
+    yield chunk
+    cache.set(cache_key, b''.join(parts), SHOPPING_LIST_CACHE_TIMEOUT)
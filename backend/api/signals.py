@@ -0,0 +1,149 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipes.models import (FeedItem, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingCartIngredient, Tag)
+from users.models import Subscription
+
+from .images import process_avatar, process_recipe_image, schedule
+from .versions import (INGREDIENTS_VERSION_KEY, RECIPES_VERSION_KEY,
+                       TAGS_VERSION_KEY, bump_version, bump_versions,
+                       get_cart_version_key)
+
+User = get_user_model()
+
+
+def bump_cart_versions(shopping_carts):
+    """После коммита обновляет версии корзин пользователей из выборки."""
+    def bump():
+        user_ids = shopping_carts.order_by().values_list(
+            'user_id', flat=True
+        ).distinct()
+        bump_versions(get_cart_version_key(user_id) for user_id in user_ids)
+    transaction.on_commit(bump)
+
+
+def bump_recipes_version():
+    """После коммита сбрасывает кэш страниц рецептов."""
+    transaction.on_commit(lambda: bump_version(RECIPES_VERSION_KEY))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def recipes_data_changed(sender, **kwargs):
+    bump_recipes_version()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_recipes_version()
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(sender, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_recipes_version()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(INGREDIENTS_VERSION_KEY))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(TAGS_VERSION_KEY))
+
+
+@receiver(post_save, sender=Tag)
+def tag_renamed(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(tags=instance).touch()
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    Recipe.objects.filter(tags=instance).touch()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, **kwargs):
+    if not created:
+        recipes = Recipe.objects.filter(ingredients=instance)
+        recipes.update_search_vector()
+        recipes.touch()
+        bump_cart_versions(
+            ShoppingCart.objects.filter(recipe__ingredients=instance)
+        )
+
+
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    recipe_ids = list(
+        Recipe.objects.filter(ingredients=instance).values_list(
+            'pk', flat=True
+        )
+    )
+    Recipe.objects.filter(pk__in=recipe_ids).touch()
+    bump_cart_versions(ShoppingCart.objects.filter(recipe__in=recipe_ids))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, created, **kwargs):
+    if not created:
+        bump_cart_versions(ShoppingCart.objects.filter(recipe=instance))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            lambda: FeedItem.objects.fan_out(instance.pk, instance.author_id)
+        )
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        FeedItem.objects.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    FeedItem.objects.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    if (instance.image
+            and instance.image_variants.get('source') != instance.image.name):
+        schedule(process_recipe_image, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def avatar_saved(sender, instance, **kwargs):
+    if (instance.avatar
+            and instance.avatar_variants.get('source')
+            != instance.avatar.name):
+        schedule(process_avatar, instance.pk)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    ShoppingCartIngredient.objects.remove_recipe(
+        instance,
+        list(instance.shopping_cart.values_list('user_id', flat=True)),
+    )
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: bump_version(get_cart_version_key(instance.user_id))
+    )
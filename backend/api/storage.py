@@ -0,0 +1,60 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+
+from .constants import MEDIA_HASH_CHUNK_SIZE
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла определяется его содержимым.
+
+    Повторная загрузка того же файла не создаёт копию, а возвращает
+    уже сохранённый, поэтому файлы никогда не перезаписываются
+    и не удаляются по запросу объекта: они могут использоваться
+    несколькими объектами. Файлы, на которые больше никто не ссылается,
+    удаляет команда collect_media.
+    """
+
+    def get_hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(MEDIA_HASH_CHUNK_SIZE):
+            digest.update(
+                chunk.encode() if isinstance(chunk, str) else chunk
+            )
+        content.seek(0)
+        dir_name, file_name = posixpath.split(str(name).replace('\\', '/'))
+        extension = posixpath.splitext(file_name)[1].lower()
+        hex_digest = digest.hexdigest()
+        return posixpath.join(
+            dir_name, hex_digest[:2], f'{hex_digest}{extension}'
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения защищает файл от collect_media,
+            # пока объект, которому он снова понадобился, не сохранён.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+    def delete(self, name):
+        """Общие файлы не удаляются по запросу отдельного объекта."""
+
+    def purge(self, name, modified_before):
+        """Удаляет файл, если он не менялся после указанного момента."""
+        try:
+            if os.path.getmtime(self.path(name)) >= modified_before:
+                return False
+        except FileNotFoundError:
+            return False
+        super().delete(name)
+        return True
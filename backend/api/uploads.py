@@ -0,0 +1,18 @@
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+
+from .constants import IMAGE_MAX_SIZE, IMAGE_SIZE_ER_MESSAGE
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загружаемый файл во временный файл по мере чтения запроса.
+
+    Загрузка прерывается, как только файл превышает допустимый размер.
+    """
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > IMAGE_MAX_SIZE:
+            raise MultiPartParserError(IMAGE_SIZE_ER_MESSAGE.format(
+                max_size=IMAGE_MAX_SIZE // (1024 * 1024)
+            ))
+        return super().receive_data_chunk(raw_data, start)
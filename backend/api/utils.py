@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Recipe
+from users.models import Subscription
+
+from .constants import PAGE_SIZE, RECIPES_LIMIT_ER_MESSAGE, RECIPES_LIMIT_MAX
+
+
+def get_subscribed_ids(request):
+    """Возвращает множество id авторов, на которых подписан пользователь.
+
+    Множество загружается одним запросом и сохраняется в объекте запроса,
+    поэтому все сериализаторы в рамках ответа используют его повторно.
+    """
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    subscribed_ids = getattr(request, '_subscribed_ids', None)
+    if subscribed_ids is None:
+        subscribed_ids = set(
+            Subscription.objects.filter(
+                user=request.user
+            ).values_list('author_id', flat=True)
+        )
+        request._subscribed_ids = subscribed_ids
+    return subscribed_ids
+
+
+def get_recipes_limit(request):
+    """Проверяет параметр recipes_limit и ограничивает его сверху."""
+    limit = request.query_params.get('recipes_limit')
+    if limit is None:
+        return PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValidationError({
+            'recipes_limit': RECIPES_LIMIT_ER_MESSAGE.format(
+                max_value=RECIPES_LIMIT_MAX
+            )
+        })
+    return min(limit, RECIPES_LIMIT_MAX)
+
+
+def get_authors_recipes(author_ids, limit):
+    """Возвращает последние рецепты и число рецептов для каждого автора.
+
+    Первые limit рецептов каждого автора и общее количество его рецептов
+    выбираются одним запросом с оконными функциями
+    ROW_NUMBER() и COUNT() OVER (PARTITION BY author).
+    """
+    recipes = defaultdict(list)
+    recipes_count = {}
+    queryset = (
+        Recipe.objects.filter(author_id__in=author_ids)
+        .annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('id').desc(),
+            ),
+            author_recipes_count=Window(
+                Count('id'),
+                partition_by=F('author_id'),
+            ),
+        )
+        .filter(row_number__lte=limit)
+        .only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time',
+            'author_id',
+        )
+        .order_by('author_id', 'row_number')
+    )
+    for recipe in queryset:
+        recipes[recipe.author_id].append(recipe)
+        recipes_count[recipe.author_id] = recipe.author_recipes_count
+    return recipes, recipes_count
@@ -0,0 +1,42 @@
+from time import time
+from uuid import uuid4
+
+from django.core.cache import cache
+
+INGREDIENTS_VERSION_KEY = 'version:ingredients'
+"""Ключ версии справочника ингредиентов."""
+TAGS_VERSION_KEY = 'version:tags'
+"""Ключ версии справочника тэгов."""
+RECIPES_VERSION_KEY = 'version:recipes'
+"""Ключ версии данных, из которых строятся страницы рецептов."""
+
+
+def get_cart_version_key(user_id):
+    """Возвращает ключ версии корзины покупок пользователя."""
+    return f'version:cart:{user_id}'
+
+
+def new_stamp():
+    return uuid4().hex, time()
+
+
+def get_stamp(key):
+    """Возвращает текущую версию данных и время её присвоения."""
+    return cache.get_or_set(key, new_stamp, timeout=None)
+
+
+def get_version(key):
+    """Возвращает текущую версию данных, хранящуюся в кэше."""
+    return get_stamp(key)[0]
+
+
+def bump_version(key):
+    """Присваивает данным новую версию, делая устаревшими прежние копии."""
+    stamp = new_stamp()
+    cache.set(key, stamp, timeout=None)
+    return stamp[0]
+
+
+def bump_versions(keys):
+    """Присваивает новые версии сразу нескольким ключам."""
+    cache.set_many({key: new_stamp() for key in keys}, timeout=None)
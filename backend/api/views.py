@@ -1,33 +1,50 @@
-from io import BytesIO
+from hashlib import md5
 
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Sum
-from django.http import FileResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Value
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django.views.decorators.http import require_GET
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import SetPasswordSerializer
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.models import (Favorite, FeedItem, Ingredient, Recipe,
+                            ShoppingCart, ShoppingCartIngredient, Tag)
 from users.models import Subscription
 
-from .filter import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .constants import RECIPE_ETAG_FIELDS
+from .filter import RecipeFilter
+from .ingredient_index import ingredient_index
+from .mixins import AnonymousCacheMixin, VersionedListMixin
+from .pagination import (CustomPagination, FeedPagination, RecipePagination,
+                         TrendingPagination)
+from .parsers import MultiPartJSONParser
 from .permissions import IsAdminOrAuthorOrReadOnly
+from .renderers import CSVRenderer, PlainTextRenderer
 from .serializers import (AvatarSerializer, CustomUserCreateSerializer,
                           CustomUserSerializer, FavoriteRecipeSerializer,
-                          IngredientSerializer, RecipeReadSerializer,
-                          RecipeSmallSerializer, RecipeWriteSerializer,
-                          ShoppingCartCreateSerializer,
+                          IngredientSerializer, RecipeIdListSerializer,
+                          RecipeReadSerializer, RecipeSmallSerializer,
+                          RecipeWriteSerializer, ShoppingCartCreateSerializer,
                           SubscriberDetailSerializer, SubscriptionSerializer,
                           TagSerializer)
+from .shopping_list import get_cache_key, stream_shopping_list
+from .utils import get_authors_recipes, get_recipes_limit
+from .versions import (INGREDIENTS_VERSION_KEY, RECIPES_VERSION_KEY,
+                       TAGS_VERSION_KEY, bump_version, get_cart_version_key,
+                       get_version)
 
 User = get_user_model()
 
@@ -103,13 +120,16 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = user.follower.annotate(
-            recipe_count=Count('author__recipes'))
+        limit = get_recipes_limit(request)
+        queryset = user.follower.select_related('author')
         pages = self.paginate_queryset(queryset)
+        author_recipes = get_authors_recipes(
+            [subscription.author_id for subscription in pages], limit
+        )
         serializer = SubscriberDetailSerializer(
             pages,
             many=True,
-            context={'request': request}
+            context={'request': request, 'author_recipes': author_recipes}
         )
         return self.get_paginated_response(serializer.data)
 
@@ -129,13 +149,6 @@ class CustomUserViewSet(UserViewSet):
             )
             serializer.is_valid(raise_exception=True)
             serializer.save()
-            queryset = (
-                user.follower
-                .annotate(recipes_count=Count('author__recipes'))
-            ).first()
-            serializer = SubscriberDetailSerializer(
-                queryset, context={'request': request}
-            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         elif self.request.method == 'DELETE':
@@ -153,43 +166,138 @@ class CustomUserViewSet(UserViewSet):
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(VersionedListMixin, viewsets.ReadOnlyModelViewSet):
     """Представление для тэгов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrAuthorOrReadOnly,)
     pagination_class = None
+    version_key = TAGS_VERSION_KEY
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(VersionedListMixin, viewsets.ReadOnlyModelViewSet):
     """Представление для ингредиентов."""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
-    search_fields = ('^name',)
+    version_key = INGREDIENTS_VERSION_KEY
 
+    def get_list_data(self, request):
+        name = request.query_params.get('name')
+        if name:
+            return ingredient_index.search(name)
+        return ingredient_index.all()
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
     """Представление для рецептов."""
 
     queryset = Recipe.objects.select_related('author').prefetch_related(
-        'tags', 'ingredients'
+        'tags', 'ingredient_list__ingredient'
     )
     permission_classes = (IsAdminOrAuthorOrReadOnly,)
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    parser_classes = (JSONParser, MultiPartJSONParser)
+    multipart_json_fields = ('tags', 'ingredients')
+    cache_version_key = RECIPES_VERSION_KEY
+
+    def get_queryset(self):
+        return super().get_queryset().with_user_flags(self.request.user)
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve', 'get-link'):
+        if self.action in (
+            'list', 'retrieve', 'get-link', 'trending', 'feed'
+        ):
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def get_detail_etag(self):
+        """Возвращает ETag рецепта для текущего пользователя.
+
+        Он зависит от версии рецепта, данных автора и отметок
+        пользователя, которые читаются одним запросом по первичному ключу.
+        """
+        user = self.request.user
+        is_subscribed = Value(False)
+        if user.is_authenticated:
+            is_subscribed = Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author_id')
+            ))
+        try:
+            stamp = Recipe.objects.filter(
+                pk=self.kwargs['pk']
+            ).with_user_flags(user).annotate(
+                is_subscribed=is_subscribed
+            ).values_list(*RECIPE_ETAG_FIELDS).first()
+        except (TypeError, ValueError):
+            return None
+        if stamp is None:
+            return None
+        digest = md5(repr(stamp).encode(), usedforsecurity=False)
+        return f'"{digest.hexdigest()}"'
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = self.get_detail_etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = self.get_cached_response(
+                super().retrieve, request, *args, **kwargs
+            )
+        if etag is not None:
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(AllowAny,),
+        pagination_class=TrendingPagination,
+        url_path='trending',
+        url_name='trending',
+    )
+    def trending(self, request):
+        return self.get_cached_response(self.get_trending, request)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        url_path='feed',
+        url_name='feed',
+    )
+    def feed(self, request):
+        """Отдаёт новые рецепты авторов из подписок пользователя."""
+        paginator = FeedPagination()
+        recipe_ids = paginator.paginate_feed(
+            FeedItem.objects, request.user, request
+        )
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes], many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_trending(self, request):
+        """Отдаёт страницу заранее рассчитанного рейтинга популярных."""
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            trend__isnull=False
+        ).annotate(trend_rank=F('trend__rank')).order_by('trend_rank')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(
         methods=['get'],
         detail=True,
@@ -222,15 +330,28 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                ShoppingCartIngredient.objects.add_recipe(recipe, [user.id])
+                Recipe.objects.filter(pk=recipe.pk).change_count(
+                    'in_carts_count', 1
+                )
             serializer = RecipeSmallSerializer(
                 recipe, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         elif request.method == 'DELETE':
-            deleted_count, _ = user.shopping_cart.filter(
-                user=user, recipe=recipe
-            ).delete()
+            with transaction.atomic():
+                deleted_count, _ = user.shopping_cart.filter(
+                    user=user, recipe=recipe
+                ).delete()
+                if deleted_count:
+                    ShoppingCartIngredient.objects.remove_recipe(
+                        recipe, [user.id]
+                    )
+                    Recipe.objects.filter(pk=recipe.pk).change_count(
+                        'in_carts_count', -1
+                    )
             if deleted_count == 0:
                 return Response(
                     {"detail": f'{recipe} не в корзине покупок.'},
@@ -238,43 +359,120 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 )
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @staticmethod
-    def buffer_for_shopping_file(user):
-        ingredients = (
-            RecipeIngredient.objects.filter(recipe__shopping_cart__user=user)
-            .values(
-                'ingredient__name',
-                'ingredient__measurement_unit'
+    def bulk_change(self, request, model, count_field):
+        """Добавляет или удаляет пачку рецептов в избранном или корзине.
+
+        Счётчик рецептов count_field меняется в той же транзакции.
+        Возвращает статус обработки для каждого переданного id.
+        """
+        serializer = RecipeIdListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        user = request.user
+        with transaction.atomic():
+            found_ids = set(
+                Recipe.objects.filter(
+                    id__in=recipe_ids
+                ).values_list('id', flat=True)
             )
-            .annotate(total_amount=Sum('amount'))
-        )
-        buffer = BytesIO()
-        for ingredient in ingredients:
-            ingredient_name = ingredient['ingredient__name']
-            measurement_unit = ingredient['ingredient__measurement_unit']
-            total_amount = ingredient['total_amount']
-            buffer.write(
-                f'{ingredient_name} - ({measurement_unit})'
-                f'— {total_amount} \n'.encode('utf-8'))
-        buffer.seek(0)
-        return buffer
+            if request.method == 'POST':
+                changed_ids = model.objects.add_recipes(user, found_ids)
+                statuses = {recipe_id: 'exists' for recipe_id in found_ids}
+                statuses.update(
+                    {recipe_id: 'created' for recipe_id in changed_ids}
+                )
+            else:
+                # Блокировка строк не даёт параллельному запросу удалить
+                # те же записи и второй раз изменить счётчики.
+                changed_ids = set(
+                    model.objects.select_for_update().filter(
+                        user=user, recipe_id__in=found_ids
+                    ).values_list('recipe_id', flat=True)
+                )
+                model.objects.filter(
+                    user=user, recipe_id__in=changed_ids
+                ).delete()
+                statuses = {recipe_id: 'absent' for recipe_id in found_ids}
+                statuses.update(
+                    {recipe_id: 'deleted' for recipe_id in changed_ids}
+                )
+            if changed_ids:
+                Recipe.objects.filter(pk__in=changed_ids).change_count(
+                    count_field, 1 if request.method == 'POST' else -1
+                )
+            if model is ShoppingCart and changed_ids:
+                if request.method == 'POST':
+                    ShoppingCartIngredient.objects.add_recipes(
+                        changed_ids, [user.id]
+                    )
+                else:
+                    ShoppingCartIngredient.objects.remove_recipes(
+                        changed_ids, [user.id]
+                    )
+                transaction.on_commit(
+                    lambda: bump_version(get_cart_version_key(user.id))
+                )
+        return Response({
+            'results': [
+                {'id': recipe_id,
+                 'status': statuses.get(recipe_id, 'not_found')}
+                for recipe_id in recipe_ids
+            ]
+        })
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        url_path='shopping_cart/bulk',
+        url_name='shopping_cart-bulk',
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_change(request, ShoppingCart, 'in_carts_count')
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        url_path='favorite/bulk',
+        url_name='favorite-bulk',
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_change(request, Favorite, 'favorites_count')
 
     @action(
         methods=('get',),
         detail=False,
         permission_classes=(IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer),
         url_path='download_shopping_cart',
         url_name='download_shopping_cart',
     )
     def download_shopping_cart(self, request):
         user = request.user
-        buffer = self.buffer_for_shopping_file(user)
-        return FileResponse(
-            buffer,
-            as_attachment=True,
-            content_type='text/plain',
-            filename='shopping_cart.txt'
+        renderer = request.accepted_renderer
+        file_format = renderer.format
+        version = get_version(get_cart_version_key(user.id))
+        etag = f'"{version}-{file_format}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        content_type = f'{renderer.media_type}; charset=utf-8'
+        cache_key = get_cache_key(user.id, version, file_format)
+        content = cache.get(cache_key)
+        if content is not None:
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(
+                stream_shopping_list(user, file_format, cache_key),
+                content_type=content_type,
+            )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"'
         )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
     @action(
         methods=['post', 'delete'],
@@ -293,15 +491,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                Recipe.objects.filter(pk=recipe.pk).change_count(
+                    'favorites_count', 1
+                )
             serializer = RecipeSmallSerializer(
                 recipe, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         elif request.method == 'DELETE':
-            deleted_count, _ = user.favorite.filter(
-                user=user, recipe=recipe
-            ).delete()
+            with transaction.atomic():
+                deleted_count, _ = user.favorite.filter(
+                    user=user, recipe=recipe
+                ).delete()
+                if deleted_count:
+                    Recipe.objects.filter(pk=recipe.pk).change_count(
+                        'favorites_count', -1
+                    )
             if deleted_count == 0:
                 return Response(
                     {"detail": f'{recipe} не в избранном.'},
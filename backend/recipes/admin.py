@@ -1,7 +1,8 @@
 from admin_auto_filters.filters import AutocompleteFilter
 from django.contrib import admin
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.pagination import EstimatedCountPaginator
+from recipes.models import Ingredient, Recipe, ShoppingCartIngredient, Tag
 
 
 class TagFilter(AutocompleteFilter):
@@ -17,6 +18,7 @@ class RecipeTagInline(admin.TabularInline):
 class RecipeIngredientInline(admin.TabularInline):
     model = Recipe.ingredients.through
     extra = 1
+    autocomplete_fields = ('ingredient', )
 
 
 @admin.register(Ingredient)
@@ -40,18 +42,37 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display_links = ('id', 'name')
     inlines = [RecipeTagInline, RecipeIngredientInline]
     list_filter = (TagFilter, )
+    autocomplete_fields = ('author', )
     search_fields = ('name',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        return queryset.select_related('author').prefetch_related(
-            'tags', 'ingredients'
+        return queryset.select_related('author')
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save_editable()
+        else:
+            super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        cart_user_ids = list(
+            recipe.shopping_cart.values_list('user_id', flat=True)
         )
-
-    @admin.display(description='В избранном у')
+        ShoppingCartIngredient.objects.remove_recipe(recipe, cart_user_ids)
+        super().save_related(request, form, formsets, change)
+        ShoppingCartIngredient.objects.add_recipe(recipe, cart_user_ids)
+        recipes = Recipe.objects.filter(pk=recipe.pk)
+        recipes.update_search_vector()
+        recipes.touch()
+
+    @admin.display(description='В избранном у', ordering='favorites_count')
     def count_favorite(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
 
 
 @admin.register(Tag)
@@ -0,0 +1,334 @@
+import base64
+import json
+import statistics
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+
+User = get_user_model()
+
+BUDGETS_PATH = Path(settings.BASE_DIR) / 'benchmark_budgets.json'
+"""Файл с бюджетами производительности эндпоинтов."""
+
+METRICS = ('queries', 'p50_ms', 'p95_ms', 'peak_kib')
+"""Сравниваемые с бюджетом показатели сценария."""
+
+
+class QueryCounter:
+    """Считает SQL-запросы, выполненные через соединение.
+
+    Точки сохранения, которыми команда откатывает изменения,
+    к запросам эндпоинта не относятся.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith(
+            ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+        ):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    """Команда для замера производительности основных эндпоинтов."""
+
+    help = (
+        'Команда выполняет запросы к основным эндпоинтам внутри процесса '
+        'на базе, заполненной командой seed_data, и замеряет количество '
+        'SQL-запросов, задержку p50/p95 и пик выделенной памяти. '
+        'Результаты сравниваются с бюджетами из benchmark_budgets.json; '
+        'при превышении команда завершается с ошибкой. На время замеров '
+        'используется кэш в памяти процесса: перед каждым сценарием он '
+        'очищается и заполняется прогревочными запросами, так что '
+        'замеряется работа с тёплым кэшем. Изменения в базе откатываются. '
+        'Синтаксис команды: python manage.py benchmark [--iterations N] '
+        '[--warmup N] [--tolerance X] [--slack-ms X] [--only NAME ...] '
+        '[--update] [--budgets PATH]. Бюджеты в репозитории сняты на базе '
+        'после python manage.py seed_data с параметрами по умолчанию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help='Допустимое превышение задержки и памяти, доля бюджета.',
+        )
+        parser.add_argument(
+            '--slack-ms', type=float, default=5.0,
+            help='Допустимое превышение задержки в миллисекундах.',
+        )
+        parser.add_argument(
+            '--only', nargs='+', default=(),
+            help='Выполнить только указанные сценарии.',
+        )
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Записать результаты в файл бюджетов.',
+        )
+        parser.add_argument('--budgets', type=Path, default=BUDGETS_PATH)
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('Нужно хотя бы две итерации.')
+        if not Recipe.objects.exists():
+            raise CommandError('Сначала заполните базу командой seed_data.')
+        budgets = {}
+        if options['budgets'].exists():
+            budgets = json.loads(options['budgets'].read_text())
+        results = {}
+        with override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'benchmark',
+            }},
+        ), transaction.atomic():
+            scenarios = self.get_scenarios()
+            unknown = set(options['only']) - set(scenarios)
+            if unknown:
+                raise CommandError(
+                    'Неизвестные сценарии: ' + ', '.join(sorted(unknown))
+                )
+            for name, scenario in scenarios.items():
+                if options['only'] and name not in options['only']:
+                    continue
+                cache.clear()
+                results[name] = self.measure(scenario, options)
+            transaction.set_rollback(True)
+        if options['update']:
+            options['budgets'].write_text(
+                json.dumps({**budgets, **results}, indent=2) + '\n'
+            )
+            self.stdout.write(f'==== Бюджеты записаны в {options["budgets"]}')
+            return
+        regressions = []
+        for name, result in results.items():
+            exceeded = self.compare(
+                result, budgets.get(name), options['tolerance'],
+                options['slack_ms'],
+            )
+            self.stdout.write(self.format(name, result, exceeded))
+            if exceeded:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(
+                'Превышены бюджеты сценариев: ' + ', '.join(regressions)
+            )
+        self.stdout.write('==== Все сценарии укладываются в бюджеты ====')
+
+    def get_client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def get_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (600, 400), (90, 160, 60)).save(buffer, 'PNG')
+        return 'data:image/png;base64,' + base64.b64encode(
+            buffer.getvalue()
+        ).decode()
+
+    def get_scenarios(self):
+        """Сценарии: имя -> (клиент, метод, путь, данные).
+
+        Пользователи и рецепты выбираются так, чтобы у них было больше
+        всего связанных данных: так запросы ближе к худшему случаю.
+        """
+        reader_id = ShoppingCart.objects.order_by().values('user').annotate(
+            carts=Count('pk')
+        ).order_by('-carts', 'user').values_list('user', flat=True).first()
+        popular = Recipe.objects.order_by('-favorites_count', 'pk').first()
+        reader_id = reader_id or popular.author_id
+        author_id = Recipe.objects.order_by().values('author').annotate(
+            recipes=Count('pk')
+        ).order_by('-recipes', 'author').values_list(
+            'author', flat=True
+        ).first()
+        reader = self.get_client(User.objects.get(pk=reader_id))
+        author = self.get_client(User.objects.get(pk=author_id))
+        anonymous = self.get_client()
+        own_recipe = Recipe.objects.filter(author_id=author_id).latest('pk')
+        other_recipe = Recipe.objects.exclude(
+            favorite__user_id=reader_id
+        ).exclude(shopping_cart__user_id=reader_id).latest('pk')
+        favorite = Favorite.objects.filter(user_id=reader_id).first()
+        cart = ShoppingCart.objects.filter(user_id=reader_id).first()
+        tags = list(Tag.objects.order_by('pk').values_list('slug', 'pk')[:2])
+        ingredient = popular.ingredients.order_by('pk').first()
+        ingredient_ids = Ingredient.objects.order_by('pk').values_list(
+            'pk', flat=True
+        )[:5]
+        recipe_data = {
+            'name': 'Замер производительности',
+            'text': 'Рецепт для замера производительности.',
+            'cooking_time': 30,
+            'tags': [pk for _, pk in tags],
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in ingredient_ids
+            ],
+        }
+        scenarios = {
+            'recipe_list': (reader, 'get', '/api/recipes/', None),
+            'recipe_list_anonymous': (
+                anonymous, 'get', '/api/recipes/', None
+            ),
+            'recipe_list_keyset': (
+                reader, 'get', '/api/recipes/', {'cursor': ''}
+            ),
+            'recipe_list_tags': (
+                reader, 'get', '/api/recipes/',
+                {'tags': [slug for slug, _ in tags]},
+            ),
+            'recipe_list_author': (
+                reader, 'get', '/api/recipes/', {'author': author_id}
+            ),
+            'recipe_list_favorited': (
+                reader, 'get', '/api/recipes/', {'is_favorited': 1}
+            ),
+            'recipe_list_in_cart': (
+                reader, 'get', '/api/recipes/', {'is_in_shopping_cart': 1}
+            ),
+            'recipe_list_search': (
+                reader, 'get', '/api/recipes/',
+                {'search': popular.name.split()[0]},
+            ),
+            'recipe_list_popular': (
+                reader, 'get', '/api/recipes/', {'ordering': 'popular'}
+            ),
+            'recipe_detail': (
+                reader, 'get', f'/api/recipes/{popular.pk}/', None
+            ),
+            'subscriptions': (
+                reader, 'get', '/api/users/subscriptions/',
+                {'recipes_limit': 3},
+            ),
+            'download_shopping_cart': (
+                reader, 'get', '/api/recipes/download_shopping_cart/', None
+            ),
+            'ingredient_search': (
+                anonymous, 'get', '/api/ingredients/',
+                {'name': ingredient.name[:3] if ingredient else 'а'},
+            ),
+            'favorite_add': (
+                reader, 'post', f'/api/recipes/{other_recipe.pk}/favorite/',
+                None,
+            ),
+            'favorite_remove': (
+                reader, 'delete',
+                f'/api/recipes/{favorite.recipe_id}/favorite/', None,
+            ) if favorite else None,
+            'shopping_cart_add': (
+                reader, 'post',
+                f'/api/recipes/{other_recipe.pk}/shopping_cart/', None,
+            ),
+            'shopping_cart_remove': (
+                reader, 'delete',
+                f'/api/recipes/{cart.recipe_id}/shopping_cart/', None,
+            ) if cart else None,
+            'recipe_create': (
+                author, 'post', '/api/recipes/',
+                {**recipe_data, 'image': self.get_image()},
+            ),
+            'recipe_update': (
+                author, 'patch', f'/api/recipes/{own_recipe.pk}/',
+                recipe_data,
+            ),
+        }
+        return {
+            name: scenario
+            for name, scenario in scenarios.items() if scenario is not None
+        }
+
+    def request(self, scenario):
+        """Выполняет запрос сценария и откатывает его изменения."""
+        client, method, path, data = scenario
+        extra = {} if method == 'get' else {'format': 'json'}
+        with transaction.atomic():
+            response = getattr(client, method)(path, data, **extra)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {path}: ответ {response.status_code}'
+            )
+
+    def measure(self, scenario, options):
+        for _ in range(options['warmup']):
+            self.request(scenario)
+        timings = []
+        counter = QueryCounter()
+        for _ in range(options['iterations']):
+            counter.count = 0
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                self.request(scenario)
+                timings.append((time.perf_counter() - start) * 1000)
+        tracemalloc.start()
+        try:
+            self.request(scenario)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        percentiles = statistics.quantiles(
+            timings, n=100, method='inclusive'
+        )
+        return {
+            'queries': counter.count,
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def compare(self, result, budget, tolerance, slack_ms):
+        """Возвращает показатели, превысившие бюджет.
+
+        Число запросов сравнивается точно, задержка и память с допуском,
+        так как зависят от машины; к задержке добавляется запас
+        на шум коротких запросов.
+        """
+        if budget is None:
+            return []
+        exceeded = []
+        for metric in METRICS:
+            if metric not in budget:
+                continue
+            limit = budget[metric]
+            if metric != 'queries':
+                limit *= 1 + tolerance
+            if metric.endswith('_ms'):
+                limit += slack_ms
+            if result[metric] > limit:
+                exceeded.append(metric)
+        return exceeded
+
+    def format(self, name, result, exceeded):
+        line = (
+            f'{name:<24} запросов {result["queries"]:>3}  '
+            f'p50 {result["p50_ms"]:>8.2f} мс  '
+            f'p95 {result["p95_ms"]:>8.2f} мс  '
+            f'память {result["peak_kib"]:>9.1f} КиБ'
+        )
+        if exceeded:
+            return line + '  ПРЕВЫШЕНО: ' + ', '.join(exceeded)
+        return line
@@ -0,0 +1,68 @@
+import posixpath
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+IMAGE_FIELDS = (
+    (Recipe, 'image', 'image_variants'),
+    (User, 'avatar', 'avatar_variants'),
+)
+"""Модели, поля изображений и поля списков их вариантов."""
+
+
+class Command(BaseCommand):
+    """Команда для удаления медиафайлов, на которые нет ссылок."""
+
+    help = (
+        'Команда удаляет фото рецептов, аватары и их варианты, на которые '
+        'не ссылается ни один рецепт или пользователь. Файлы, изменённые '
+        'позже чем --min-age-hours часов назад, не удаляются: они могут '
+        'принадлежать ещё не сохранённым объектам. Синтаксис команды: '
+        'python manage.py collect_media [--min-age-hours N].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age-hours', type=float, default=24)
+
+    def get_referenced(self):
+        """Возвращает имена всех файлов, на которые ссылаются объекты."""
+        referenced = set()
+        for model, image_field, variants_field in IMAGE_FIELDS:
+            for image, variants in model.objects.values_list(
+                image_field, variants_field
+            ).iterator():
+                referenced.add(image)
+                for formats in variants.values():
+                    if isinstance(formats, dict):
+                        referenced.update(formats.values())
+        return referenced
+
+    def walk(self, directory):
+        if not default_storage.exists(directory):
+            return
+        directories, files = default_storage.listdir(directory)
+        for name in files:
+            yield posixpath.join(directory, name)
+        for name in directories:
+            yield from self.walk(posixpath.join(directory, name))
+
+    def handle(self, *args, **options):
+        modified_before = time.time() - options['min_age_hours'] * 3600
+        referenced = self.get_referenced()
+        removed = 0
+        for model, image_field, _ in IMAGE_FIELDS:
+            directory = model._meta.get_field(image_field).upload_to
+            for name in self.walk(directory.rstrip('/')):
+                if name not in referenced and default_storage.purge(
+                    name, modified_before
+                ):
+                    removed += 1
+        self.stdout.write(
+            f'==== Удалено неиспользуемых файлов: {removed} ===='
+        )
@@ -0,0 +1,74 @@
+from collections import defaultdict
+from datetime import timedelta
+from math import log
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import F, FloatField, Func, Sum, Value
+from django.db.models.functions import Exp
+from django.utils import timezone
+
+from api.constants import (TRENDING_HALF_LIFE_HOURS, TRENDING_SIZE,
+                           TRENDING_WEIGHTS, TRENDING_WINDOW_DAYS)
+from api.versions import RECIPES_VERSION_KEY, bump_version
+from recipes.models import Favorite, RecipeTrend, ShoppingCart
+
+
+class Epoch(Func):
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = FloatField()
+
+
+class Command(BaseCommand):
+    """Команда для пересчёта рейтинга популярных рецептов."""
+
+    help = (
+        'Команда пересчитывает рейтинг популярных рецептов: каждое '
+        'добавление в избранное или корзину за последние дни учитывается '
+        'с весом, убывающим со временем. Синтаксис команды: '
+        'python manage.py compute_trending [--window-days N] '
+        '[--half-life-hours N].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window-days', type=int, default=TRENDING_WINDOW_DAYS
+        )
+        parser.add_argument(
+            '--half-life-hours', type=float, default=TRENDING_HALF_LIFE_HOURS
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        since = now - timedelta(days=options['window_days'])
+        decay = log(2) / (options['half_life_hours'] * 3600)
+        scores = defaultdict(float)
+        for model, weight in (
+            (Favorite, TRENDING_WEIGHTS['favorite']),
+            (ShoppingCart, TRENDING_WEIGHTS['shopping_cart']),
+        ):
+            rows = (
+                model.objects.filter(created__gte=since)
+                .order_by()
+                .values('recipe')
+                .annotate(score=Sum(Exp(
+                    (Epoch(F('created')) - Value(now.timestamp()))
+                    * Value(decay)
+                )))
+                .values_list('recipe', 'score')
+            )
+            for recipe_id, score in rows.iterator():
+                scores[recipe_id] += weight * score
+        ranking = sorted(
+            scores.items(), key=lambda item: (-item[1], item[0])
+        )[:TRENDING_SIZE]
+        with transaction.atomic():
+            RecipeTrend.objects.all().delete()
+            RecipeTrend.objects.bulk_create(
+                RecipeTrend(recipe_id=recipe_id, score=score, rank=rank)
+                for rank, (recipe_id, score) in enumerate(ranking, start=1)
+            )
+            transaction.on_commit(lambda: bump_version(RECIPES_VERSION_KEY))
+        self.stdout.write(
+            f'==== В рейтинге популярных {len(ranking)} рецептов ===='
+        )
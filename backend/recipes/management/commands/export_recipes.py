@@ -0,0 +1,76 @@
+import json
+import shutil
+from pathlib import Path
+
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для выгрузки рецептов в файл JSONL."""
+
+    help = (
+        'Команда выгружает рецепты по одному в строке JSON с тэгами, '
+        'ингредиентами и ссылкой на фото. С параметром --images-dir '
+        'файлы фото копируются в указанный каталог. Синтаксис команды: '
+        'python manage.py export_recipes /путь к файлу/ '
+        '[--images-dir DIR] [--batch-size N].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', type=str)
+        parser.add_argument('--images-dir', type=str)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        images_dir = options['images_dir']
+        batch_size = options['batch_size']
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'ingredient_list__ingredient'
+        ).order_by('pk')
+        last_id = 0
+        exported = 0
+        with open(options['file_path'], mode='w', encoding='utf-8') as file:
+            while True:
+                batch = list(recipes.filter(pk__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                for recipe in batch:
+                    file.write(
+                        json.dumps(self.serialize(recipe), ensure_ascii=False)
+                        + '\n'
+                    )
+                    if images_dir and recipe.image:
+                        self.copy_image(recipe.image.name, Path(images_dir))
+                exported += len(batch)
+                last_id = batch[-1].pk
+        self.stdout.write(f'==== Выгружено рецептов: {exported} ====')
+
+    def serialize(self, recipe):
+        return {
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'author': recipe.author.email,
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                {
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.ingredient_list.all()
+            ],
+            'image': recipe.image.name,
+        }
+
+    def copy_image(self, name, images_dir):
+        target = images_dir / name
+        if target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with default_storage.open(name, 'rb') as source, \
+                open(target, 'wb') as destination:
+            shutil.copyfileobj(source, destination)
@@ -1,33 +1,155 @@
 import csv
+import json
+from itertools import islice
+from pathlib import Path
 
-from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
-from recipes.models import Ingredient
+from api.constants import (INGREDIENT_NAME_MAX_LENGTH,
+                           MEASUREMENT_UNIT_MAX_LENGTH)
+from api.signals import bump_cart_versions
+from api.versions import (INGREDIENTS_VERSION_KEY, RECIPES_VERSION_KEY,
+                          bump_version)
+from recipes.models import Ingredient, Recipe, ShoppingCart
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Читает элементы JSON-массива по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if not started and buffer.startswith('['):
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                if buffer:
+                    raise CommandError('Некорректный JSON-файл.')
+                return
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        yield row[:2] if len(row) >= 2 else None
+
+
+def get_pair(item):
+    if isinstance(item, dict):
+        return item.get('name'), item.get('measurement_unit')
+    return None
+
+
+def read_json(file):
+    for item in iter_json_array(file):
+        yield get_pair(item)
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            try:
+                yield get_pair(json.loads(line))
+            except json.JSONDecodeError:
+                yield None
+
+
+READERS = {'.csv': read_csv, '.json': read_json, '.jsonl': read_jsonl}
+"""Функции чтения пар (название, единица измерения) по расширению файла."""
 
 
 class Command(BaseCommand):
-    """Команда для очистки базы данных и загрузки csv файла."""
+    """Команда для загрузки ингредиентов из csv или json файла."""
 
     help = (
-        'Команда для импорта данных в модель Ingredients. '
-        'Синтаксис команды: python manage.py import_csv /путь к файлу/. '
+        'Команда для импорта данных в модель Ingredients. Файл читается '
+        'пакетами, новые ингредиенты добавляются, у существующих '
+        'обновляется единица измерения, ничего не удаляется. '
+        'Синтаксис команды: python manage.py import_csv /путь к файлу/ '
+        '[--batch-size N].'
     )
 
     def add_arguments(self, parser):
-        parser.add_argument('file_path', nargs=1, type=str)
+        parser.add_argument('file_path', type=str)
+        parser.add_argument('--batch-size', type=int, default=5000)
 
     def handle(self, *args, **options):
-        file_path = f'{settings.BASE_DIR}/data/ingredients.csv'
-        Ingredient.objects.all().delete()
-        items_list = []
-        with open(file_path, mode='r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                model_item = Ingredient(
-                    name=row[0],
-                    measurement_unit=row[1],
+        path = Path(options['file_path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(
+                'Поддерживаются файлы: ' + ', '.join(READERS)
+            )
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден.')
+        self.inserted = self.updated = self.skipped = 0
+        with open(path, mode='r', encoding='utf-8') as file:
+            rows = reader(file)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.import_batch(batch)
+        if self.inserted or self.updated:
+            bump_version(INGREDIENTS_VERSION_KEY)
+        self.stdout.write(
+            f'==== Импорт в модель Ingredient: добавлено {self.inserted}, '
+            f'обновлено {self.updated}, пропущено {self.skipped} ===='
+        )
+
+    def import_batch(self, batch):
+        units = {}
+        for row in batch:
+            name, unit = row if row else (None, None)
+            if (not isinstance(name, str) or not isinstance(unit, str)
+                    or not name.strip() or not unit.strip()
+                    or len(name.strip()) > INGREDIENT_NAME_MAX_LENGTH
+                    or len(unit.strip()) > MEASUREMENT_UNIT_MAX_LENGTH):
+                self.skipped += 1
+                continue
+            name = name.strip()
+            if name in units:
+                self.skipped += 1
+            units[name] = unit.strip()
+        existing = {
+            name: (pk, unit)
+            for pk, name, unit in Ingredient.objects.filter(
+                name__in=units
+            ).values_list('pk', 'name', 'measurement_unit')
+        }
+        new = [
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in units.items() if name not in existing
+        ]
+        changed = [
+            Ingredient(pk=existing[name][0], measurement_unit=unit)
+            for name, unit in units.items()
+            if name in existing and existing[name][1] != unit
+        ]
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+            if changed:
+                Ingredient.objects.bulk_update(changed, ['measurement_unit'])
+                changed_ids = [ingredient.pk for ingredient in changed]
+                Recipe.objects.filter(ingredients__in=changed_ids).touch()
+                bump_cart_versions(ShoppingCart.objects.filter(
+                    recipe__ingredients__in=changed_ids
+                ))
+                transaction.on_commit(
+                    lambda: bump_version(RECIPES_VERSION_KEY)
                 )
-                items_list.append(model_item)
-            Ingredient.objects.bulk_create(items_list)
-            self.stdout.write('==== Успешный импорт в модель Ingredient ====')
+        self.inserted += len(new)
+        self.updated += len(changed)
+        self.skipped += len(units) - len(new) - len(changed)
@@ -0,0 +1,249 @@
+import base64
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from itertools import islice, repeat
+from multiprocessing import get_context
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+from django.db import connections, transaction
+from PIL import Image
+
+from api.constants import (COOKING_TIME_MAX_VALUE, COOKING_TIME_MIN_VALUE,
+                           INGREDIENTS_MIN_AMOUNT, RECIPE_NAME_MAX_LENGTH)
+from api.versions import RECIPES_VERSION_KEY, bump_version
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+
+def store_image(reference, images_dir):
+    """Проверяет фото рецепта и сохраняет его в хранилище.
+
+    Выполняется в отдельном процессе. Принимает строку data:image;base64,
+    имя файла в текущем хранилище или путь относительно images_dir.
+    Возвращает пару (имя в хранилище, текст ошибки).
+    """
+    try:
+        if reference.startswith('data:image'):
+            format, _, encoded = reference.partition(';base64,')
+            content = base64.b64decode(encoded)
+            name = 'image.' + format.split('/')[-1]
+        elif default_storage.exists(reference):
+            return reference, None
+        else:
+            path = Path(images_dir) / reference
+            content = path.read_bytes()
+            name = path.name
+        with Image.open(BytesIO(content)) as image:
+            image.verify()
+        return default_storage.save(
+            Recipe.image.field.generate_filename(None, name),
+            ContentFile(content),
+        ), None
+    except Exception as error:
+        return None, f'фото не загружено: {error}'
+
+
+def validate(record):
+    """Возвращает текст ошибки, если запись рецепта некорректна."""
+    if not isinstance(record, dict):
+        return 'запись должна быть объектом JSON'
+    name = record.get('name')
+    if not isinstance(name, str) or not 0 < len(name) <= (
+        RECIPE_NAME_MAX_LENGTH
+    ):
+        return 'некорректное название'
+    if not isinstance(record.get('text'), str) or not record['text']:
+        return 'некорректное описание'
+    cooking_time = record.get('cooking_time')
+    if not isinstance(cooking_time, int) or not (
+        COOKING_TIME_MIN_VALUE <= cooking_time <= COOKING_TIME_MAX_VALUE
+    ):
+        return 'некорректное время готовки'
+    if not isinstance(record.get('author'), str):
+        return 'не указан автор'
+    if not isinstance(record.get('image'), str) or not record['image']:
+        return 'не указано фото'
+    tags = record.get('tags')
+    if (not isinstance(tags, list) or not tags
+            or not all(isinstance(tag, str) for tag in tags)
+            or len(set(tags)) != len(tags)):
+        return 'некорректные тэги'
+    ingredients = record.get('ingredients')
+    if not isinstance(ingredients, list) or not ingredients:
+        return 'не указаны ингредиенты'
+    for item in ingredients:
+        if (not isinstance(item, dict)
+                or not isinstance(item.get('name'), str)
+                or not isinstance(item.get('amount'), int)
+                or item['amount'] < INGREDIENTS_MIN_AMOUNT):
+            return 'некорректный ингредиент'
+    if len({item['name'] for item in ingredients}) != len(ingredients):
+        return 'ингредиенты повторяются'
+    return None
+
+
+class Command(BaseCommand):
+    """Команда для загрузки рецептов из файла JSONL."""
+
+    help = (
+        'Команда загружает рецепты из файла JSONL, созданного командой '
+        'export_recipes. Записи обрабатываются пакетами, фото сохраняются '
+        'в нескольких процессах, уже существующие рецепты автора с тем же '
+        'названием пропускаются. С параметром --resume загрузка '
+        'продолжается со строки, на которой была прервана. Варианты фото '
+        'создаются командой process_images. Синтаксис команды: '
+        'python manage.py import_recipes /путь к файлу/ [--images-dir DIR] '
+        '[--batch-size N] [--workers N] [--resume] [--state-file PATH].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', type=str)
+        parser.add_argument('--images-dir', type=str)
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--resume', action='store_true')
+        parser.add_argument('--state-file', type=str)
+
+    def handle(self, *args, **options):
+        path = Path(options['file_path'])
+        images_dir = Path(options['images_dir'] or path.parent)
+        state_file = Path(options['state_file'] or f'{path}.state')
+        start_line = 0
+        if options['resume'] and state_file.exists():
+            start_line = json.loads(state_file.read_text())['line']
+        self.imported = self.skipped = self.failed = 0
+        # Процессы создаются сразу и без открытых соединений с базой,
+        # чтобы дочерние процессы не унаследовали их.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], mp_context=get_context('fork')
+        ) as executor, open(path, mode='r', encoding='utf-8') as file:
+            executor.submit(int).result()
+            lines = islice(enumerate(file, start=1), start_line, None)
+            while True:
+                batch = list(islice(lines, options['batch_size']))
+                if not batch:
+                    break
+                self.import_batch(batch, executor, images_dir)
+                self.save_state(state_file, batch[-1][0])
+        state_file.unlink(missing_ok=True)
+        self.stdout.write(
+            f'==== Загружено рецептов: {self.imported}, '
+            f'пропущено: {self.skipped}, с ошибками: {self.failed} ===='
+        )
+
+    def save_state(self, state_file, line):
+        temporary = state_file.with_name(state_file.name + '.tmp')
+        temporary.write_text(json.dumps({'line': line}))
+        os.replace(temporary, state_file)
+
+    def fail(self, line, error):
+        self.failed += 1
+        self.stderr.write(f'Строка {line}: {error}')
+
+    def parse(self, batch):
+        records = []
+        for line, text in batch:
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except json.JSONDecodeError:
+                self.fail(line, 'некорректный JSON')
+                continue
+            error = validate(record)
+            if error:
+                self.fail(line, error)
+                continue
+            records.append((line, record))
+        return records
+
+    def import_batch(self, batch, executor, images_dir):
+        records = self.parse(batch)
+        authors = User.objects.in_bulk(
+            {record['author'] for _, record in records}, field_name='email'
+        )
+        tags = Tag.objects.in_bulk(
+            {slug for _, record in records for slug in record['tags']},
+            field_name='slug',
+        )
+        ingredients = Ingredient.objects.in_bulk(
+            {
+                item['name']
+                for _, record in records for item in record['ingredients']
+            },
+            field_name='name',
+        )
+        existing = set(
+            Recipe.objects.filter(
+                author__in=authors.values(),
+                name__in={record['name'] for _, record in records},
+            ).values_list('author_id', 'name')
+        )
+        accepted = []
+        for line, record in records:
+            author = authors.get(record['author'])
+            if author is None:
+                self.fail(line, f'автор {record["author"]} не найден')
+                continue
+            if (author.pk, record['name']) in existing:
+                self.skipped += 1
+                continue
+            missing = [slug for slug in record['tags'] if slug not in tags]
+            missing += [
+                item['name'] for item in record['ingredients']
+                if item['name'] not in ingredients
+            ]
+            if missing:
+                self.fail(line, 'не найдены: ' + ', '.join(missing))
+                continue
+            existing.add((author.pk, record['name']))
+            accepted.append((line, record, author))
+        images = executor.map(
+            store_image,
+            [record['image'] for _, record, _ in accepted],
+            repeat(images_dir),
+        )
+        recipes = []
+        for (line, record, author), (image, error) in zip(accepted, images):
+            if error:
+                self.fail(line, error)
+                continue
+            recipe = Recipe(
+                author=author,
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=image,
+            )
+            recipes.append((recipe, record))
+        if not recipes:
+            return
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipe for recipe, _ in recipes)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredients[item['name']],
+                    amount=item['amount'],
+                )
+                for recipe, record in recipes
+                for item in record['ingredients']
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe=recipe, tag=tags[slug])
+                for recipe, record in recipes
+                for slug in record['tags']
+            )
+            Recipe.objects.filter(
+                pk__in=[recipe.pk for recipe, _ in recipes]
+            ).update_search_vector()
+            transaction.on_commit(lambda: bump_version(RECIPES_VERSION_KEY))
+        self.imported += len(recipes)
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+
+from api.images import process_avatar, process_recipe_image
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Команда для создания недостающих вариантов изображений."""
+
+    help = (
+        'Команда создаёт уменьшенные варианты фото рецептов и аватаров, '
+        'которые ещё не были обработаны. '
+        'Синтаксис команды: python manage.py process_images.'
+    )
+
+    def process(self, queryset, image_field, variants_field, task):
+        processed = 0
+        for pk, image, variants in queryset.exclude(
+            **{image_field: ''}
+        ).values_list('pk', image_field, variants_field).iterator():
+            if variants.get('source') != image:
+                task(pk)
+                processed += 1
+        return processed
+
+    def handle(self, *args, **options):
+        recipes = self.process(
+            Recipe.objects.all(), 'image', 'image_variants',
+            process_recipe_image,
+        )
+        avatars = self.process(
+            User.objects.all(), 'avatar', 'avatar_variants', process_avatar
+        )
+        self.stdout.write(
+            f'==== Обработано фото рецептов: {recipes}, '
+            f'аватаров: {avatars} ===='
+        )
@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для пересчёта поисковых векторов рецептов."""
+
+    help = (
+        'Команда пересчитывает поисковый индекс рецептов пакетами. '
+        'Синтаксис команды: python manage.py rebuild_search_index '
+        '[--batch-size N].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(
+                Recipe.objects.filter(pk__gt=last_id)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            updated += Recipe.objects.filter(
+                pk__in=batch
+            ).update_search_vector()
+            last_id = batch[-1]
+        self.stdout.write(
+            f'==== Поисковый индекс обновлён для {updated} рецептов ===='
+        )
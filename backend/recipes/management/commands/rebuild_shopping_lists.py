@@ -0,0 +1,67 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingCart, ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    """Команда для проверки и пересборки списков покупок."""
+
+    help = (
+        'Команда сверяет суммы ингредиентов в списках покупок с корзинами '
+        'и пересобирает расходящиеся списки. '
+        'Синтаксис команды: python manage.py rebuild_shopping_lists '
+        '[--verify] [--batch-size N].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сообщить о расхождениях, не исправляя их.',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def get_user_ids(self):
+        cart_user_ids = ShoppingCart.objects.values_list('user_id', flat=True)
+        list_user_ids = ShoppingCartIngredient.objects.values_list(
+            'user_id', flat=True
+        )
+        return sorted(
+            set(cart_user_ids.distinct()) | set(list_user_ids.distinct())
+        )
+
+    def get_broken_user_ids(self, user_ids):
+        expected = ShoppingCartIngredient.objects.aggregate_from_carts(
+            user_ids
+        )
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartIngredient.objects.filter(
+                user_id__in=user_ids
+            ).values_list('user_id', 'ingredient_id', 'amount')
+        }
+        return {
+            user_id
+            for (user_id, _), _ in expected.items() ^ actual.items()
+        }
+
+    def handle(self, *args, **options):
+        user_ids = self.get_user_ids()
+        batch_size = options['batch_size']
+        broken_count = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            with transaction.atomic():
+                broken_user_ids = self.get_broken_user_ids(batch)
+                if broken_user_ids and not options['verify']:
+                    ShoppingCartIngredient.objects.rebuild(broken_user_ids)
+            broken_count += len(broken_user_ids)
+            for user_id in sorted(broken_user_ids):
+                self.stdout.write(f'Расхождение в списке покупок: {user_id}')
+        action = 'найдено' if options['verify'] else 'исправлено'
+        self.stdout.write(
+            f'==== Проверено списков: {len(user_ids)}, '
+            f'{action} расхождений: {broken_count} ===='
+        )
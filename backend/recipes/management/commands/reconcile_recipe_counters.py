@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для сверки счётчиков избранного и корзин рецептов."""
+
+    help = (
+        'Команда пересчитывает счётчики избранного и корзин у рецептов, '
+        'где они разошлись с данными. Синтаксис команды: '
+        'python manage.py reconcile_recipe_counters [--batch-size N].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        fixed = 0
+        while True:
+            batch = list(
+                Recipe.objects.filter(pk__gt=last_id)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            fixed += Recipe.objects.filter(pk__in=batch).reconcile_counters()
+            last_id = batch[-1]
+        self.stdout.write(
+            f'==== Счётчики исправлены у {fixed} рецептов ===='
+        )
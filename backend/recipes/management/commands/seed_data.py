@@ -0,0 +1,436 @@
+import csv
+import random
+from datetime import timedelta
+from io import BytesIO, StringIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError, call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from PIL import Image
+
+from api.constants import (COOKING_TIME_MAX_VALUE, COOKING_TIME_MIN_VALUE,
+                           FEED_BACKFILL_SIZE, FEED_FANOUT_MAX_FOLLOWERS,
+                           SEED_ACTIVITY_ALPHA, SEED_MAX_AGE_DAYS,
+                           SEED_ZIPF_EXPONENT)
+from api.versions import RECIPES_VERSION_KEY, TAGS_VERSION_KEY, bump_versions
+from recipes.models import (Favorite, FeedItem, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart,
+                            ShoppingCartIngredient, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', 'Елена', 'Дмитрий',
+    'Наталья', 'Алексей', 'Ирина', 'Михаил',
+)
+LAST_NAMES = (
+    'Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев',
+    'Козлов', 'Новиков', 'Морозов', 'Волков',
+)
+ADJECTIVES = (
+    'Домашний', 'Быстрый', 'Пряный', 'Летний', 'Сытный', 'Лёгкий',
+    'Бабушкин', 'Праздничный', 'Постный', 'Острый',
+)
+DISHES = (
+    'борщ', 'плов', 'салат', 'пирог', 'суп', 'омлет', 'рагу', 'гуляш',
+    'пудинг', 'соус', 'кекс', 'ризотто',
+)
+SENTENCES = (
+    'Нарежьте овощи небольшими кубиками.',
+    'Обжарьте лук до золотистого цвета.',
+    'Добавьте специи и перемешайте.',
+    'Тушите под крышкой на медленном огне.',
+    'Посолите и поперчите по вкусу.',
+    'Выложите на противень и запекайте.',
+    'Подавайте горячим со свежей зеленью.',
+    'Дайте настояться несколько минут.',
+)
+
+
+class ZipfSampler:
+    """Выбирает индексы с вероятностью, убывающей степенно от ранга.
+
+    Ранги индексов перемешиваются, поэтому самые популярные объекты
+    не совпадают с первыми id.
+    """
+
+    def __init__(self, rng, size, exponent):
+        self.rng = rng
+        self.population = list(range(size))
+        rng.shuffle(self.population)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, size + 1)
+        ))
+
+    def choices(self, k):
+        return self.rng.choices(
+            self.population, cum_weights=self.cum_weights, k=k
+        )
+
+    def sample(self, k, exclude=None):
+        """Возвращает до k различных индексов, кроме exclude.
+
+        Редкие индексы выпадают нечасто, поэтому число попыток
+        ограничено и результат может быть меньше k.
+        """
+        k = min(k, len(self.population) - (exclude is not None))
+        chosen = set()
+        for _ in range(10):
+            if len(chosen) >= k:
+                break
+            chosen.update(self.choices(k - len(chosen)))
+            chosen.discard(exclude)
+        return sorted(chosen)[:k]
+
+
+def get_activity(rng, mean):
+    """Число действий пользователя с распределением Парето и средним mean."""
+    return int(
+        mean * (SEED_ACTIVITY_ALPHA - 1) / SEED_ACTIVITY_ALPHA
+        * rng.paretovariate(SEED_ACTIVITY_ALPHA)
+    )
+
+
+def get_age(rng, now, days):
+    """Случайный момент за последние days дней, ближе к now чаще."""
+    return now - timedelta(days=min(rng.expovariate(4 / days), days))
+
+
+class Command(BaseCommand):
+    """Команда для генерации большого набора тестовых данных."""
+
+    help = (
+        'Команда создаёт пользователей, тэги, рецепты, подписки, избранное '
+        'и корзины покупок с неравномерным распределением: немногие авторы '
+        'пишут и собирают подписчиков больше всех, немногие рецепты '
+        'популярнее остальных. Данные определяются параметром --seed и '
+        'загружаются через COPY. Ингредиенты берутся из базы, поэтому '
+        'сначала выполните import_csv. Синтаксис команды: '
+        'python manage.py seed_data [--users N] [--recipes N] [--tags N] '
+        '[--subscriptions N] [--favorites N] [--carts N] [--seed N] '
+        '[--exponent X] [--password PASSWORD] [--batch-size N].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=30)
+        parser.add_argument(
+            '--subscriptions', type=int, default=20,
+            help='Среднее количество подписок пользователя.',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=30,
+            help='Среднее количество избранных рецептов пользователя.',
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Среднее количество рецептов в корзине пользователя.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--exponent', type=float, default=SEED_ZIPF_EXPONENT
+        )
+        parser.add_argument(
+            '--password',
+            help='Пароль пользователей; без него войти под ними нельзя.',
+        )
+        parser.add_argument('--batch-size', type=int, default=50000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и рецепт.')
+        self.options = options
+        self.prefix = f'seed{options["seed"]}'
+        if User.objects.filter(
+            username__startswith=f'{self.prefix}_'
+        ).exists():
+            raise CommandError(
+                f'Данные с --seed {options["seed"]} уже загружены.'
+            )
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        if not self.ingredient_ids:
+            raise CommandError(
+                'Ингредиентов нет, сначала выполните import_csv.'
+            )
+        self.now = timezone.now()
+        self.image = self.save_image()
+        self.user_start = self.get_start(User)
+        self.recipe_start = self.get_start(Recipe)
+        self.favorites_count = [0] * options['recipes']
+        self.in_carts_count = [0] * options['recipes']
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.cursor = cursor
+            self.tag_ids = self.create_tags()
+            self.recipe_authors = ZipfSampler(
+                self.get_random('authors'), options['users'],
+                options['exponent'],
+            ).choices(options['recipes'])
+            self.copy(User, (
+                'id', 'password', 'last_login', 'is_superuser', 'username',
+                'first_name', 'last_name', 'email', 'is_staff', 'is_active',
+                'date_joined', 'avatar', 'avatar_variants',
+            ), self.generate_users())
+            self.copy(
+                Subscription, ('id', 'user', 'author'),
+                self.generate_subscriptions(),
+            )
+            self.copy(
+                Favorite, ('id', 'recipe', 'user', 'created'),
+                self.generate_actions(
+                    Favorite, 'favorites', self.favorites_count
+                ),
+            )
+            self.copy(
+                ShoppingCart, ('id', 'recipe', 'user', 'created'),
+                self.generate_actions(
+                    ShoppingCart, 'carts', self.in_carts_count
+                ),
+            )
+            self.copy(Recipe, (
+                'id', 'name', 'text', 'cooking_time', 'image',
+                'image_variants', 'author', 'search_vector', 'updated_at',
+                'version', 'favorites_count', 'in_carts_count', 'fanned_out',
+            ), self.generate_recipes())
+            self.copy(
+                RecipeIngredient, ('id', 'recipe', 'ingredient', 'amount'),
+                self.generate_recipe_ingredients(),
+            )
+            self.copy(
+                Recipe.tags.through, ('id', 'recipe', 'tag'),
+                self.generate_recipe_tags(),
+            )
+            for statement in connection.ops.sequence_reset_sql(no_style(), (
+                User, Subscription, Favorite, ShoppingCart, Recipe,
+                RecipeIngredient, Recipe.tags.through,
+            )):
+                cursor.execute(statement)
+            self.build_shopping_lists()
+            self.build_feeds()
+            self.update_search_vectors()
+            transaction.on_commit(lambda: bump_versions(
+                (RECIPES_VERSION_KEY, TAGS_VERSION_KEY)
+            ))
+        with connection.cursor() as cursor:
+            for model in (
+                User, Subscription, Favorite, ShoppingCart, Recipe,
+                RecipeIngredient, Recipe.tags.through, ShoppingCartIngredient,
+                FeedItem,
+            ):
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(f'ANALYZE {table}')
+        call_command('compute_trending', stdout=self.stdout)
+        self.stdout.write('==== Тестовые данные загружены ====')
+
+    def get_random(self, name):
+        """Отдельный генератор для каждого набора данных.
+
+        Так изменение одного параметра не меняет остальные наборы.
+        """
+        return random.Random(f'{self.prefix}:{name}')
+
+    def get_start(self, model):
+        return (model.objects.aggregate(max_id=Max('pk'))['max_id'] or 0) + 1
+
+    def save_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (600, 400), (200, 120, 60)).save(buffer, 'PNG')
+        return default_storage.save(
+            Recipe.image.field.generate_filename(None, 'seed.png'),
+            ContentFile(buffer.getvalue()),
+        )
+
+    def copy(self, model, fields, rows):
+        """Загружает строки в таблицу модели командой COPY по частям."""
+        quote_name = connection.ops.quote_name
+        columns = ', '.join(
+            quote_name(model._meta.get_field(field).column)
+            for field in fields
+        )
+        sql = (
+            f'COPY {quote_name(model._meta.db_table)} ({columns}) '
+            "FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        )
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        count = 0
+        for row in rows:
+            writer.writerow('\\N' if value is None else value for value in row)
+            count += 1
+            if count % self.options['batch_size'] == 0:
+                self.flush(sql, buffer)
+        self.flush(sql, buffer)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {count}')
+
+    def flush(self, sql, buffer):
+        buffer.seek(0)
+        self.cursor.copy_expert(sql, buffer)
+        buffer.seek(0)
+        buffer.truncate()
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            (
+                Tag(name=f'Тэг {index}', slug=f'{self.prefix}-{index}')
+                for index in range(self.options['tags'])
+            ),
+            ignore_conflicts=True,
+        )
+        return list(
+            Tag.objects.filter(slug__startswith=f'{self.prefix}-')
+            .order_by('pk').values_list('pk', flat=True)
+        )
+
+    def generate_users(self):
+        rng = self.get_random('users')
+        password = make_password(self.options['password'])
+        for index in range(self.options['users']):
+            username = f'{self.prefix}_{index}'
+            yield (
+                self.user_start + index, password, None, False, username,
+                rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                f'{username}@example.com', False, True,
+                get_age(rng, self.now, 365 * 3), '', '{}',
+            )
+
+    def generate_subscriptions(self):
+        rng = self.get_random('subscriptions')
+        sampler = ZipfSampler(
+            self.get_random('authors'), self.options['users'],
+            self.options['exponent'],
+        )
+        row_id = self.get_start(Subscription)
+        for user in range(self.options['users']):
+            activity = get_activity(rng, self.options['subscriptions'])
+            for author in sampler.sample(activity, exclude=user):
+                yield row_id, self.user_start + user, self.user_start + author
+                row_id += 1
+
+    def generate_actions(self, model, name, counts):
+        rng = self.get_random(name)
+        sampler = ZipfSampler(
+            self.get_random('popularity'), self.options['recipes'],
+            self.options['exponent'],
+        )
+        row_id = self.get_start(model)
+        for user in range(self.options['users']):
+            activity = get_activity(rng, self.options[name])
+            for recipe in sampler.sample(activity):
+                counts[recipe] += 1
+                yield (
+                    row_id, self.recipe_start + recipe,
+                    self.user_start + user,
+                    get_age(rng, self.now, SEED_MAX_AGE_DAYS),
+                )
+                row_id += 1
+
+    def generate_recipes(self):
+        rng = self.get_random('recipes')
+        for index, author in enumerate(self.recipe_authors):
+            yield (
+                self.recipe_start + index,
+                f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} {index}',
+                ' '.join(rng.sample(SENTENCES, rng.randint(2, 5))),
+                rng.randint(COOKING_TIME_MIN_VALUE, COOKING_TIME_MAX_VALUE),
+                self.image, '{}', self.user_start + author, None,
+                get_age(rng, self.now, 365 * 3), 1,
+                self.favorites_count[index], self.in_carts_count[index],
+                False,
+            )
+
+    def generate_recipe_ingredients(self):
+        rng = self.get_random('recipe_ingredients')
+        sampler = ZipfSampler(
+            rng, len(self.ingredient_ids), self.options['exponent']
+        )
+        row_id = self.get_start(RecipeIngredient)
+        for index in range(self.options['recipes']):
+            for ingredient in sampler.sample(rng.randint(3, 12)):
+                yield (
+                    row_id, self.recipe_start + index,
+                    self.ingredient_ids[ingredient], rng.randint(1, 500),
+                )
+                row_id += 1
+
+    def generate_recipe_tags(self):
+        if not self.tag_ids:
+            return
+        rng = self.get_random('recipe_tags')
+        sampler = ZipfSampler(rng, len(self.tag_ids), self.options['exponent'])
+        row_id = self.get_start(Recipe.tags.through)
+        for index in range(self.options['recipes']):
+            for tag in sampler.sample(rng.randint(1, 3)):
+                yield row_id, self.recipe_start + index, self.tag_ids[tag]
+                row_id += 1
+
+    def build_shopping_lists(self):
+        """Собирает списки покупок новых пользователей по их корзинам."""
+        quote_name = connection.ops.quote_name
+        self.cursor.execute(
+            f'INSERT INTO '
+            f'{quote_name(ShoppingCartIngredient._meta.db_table)} '
+            '(user_id, ingredient_id, amount) '
+            'SELECT cart.user_id, item.ingredient_id, SUM(item.amount) '
+            f'FROM {quote_name(ShoppingCart._meta.db_table)} cart '
+            f'JOIN {quote_name(RecipeIngredient._meta.db_table)} item '
+            'ON item.recipe_id = cart.recipe_id '
+            'WHERE cart.user_id >= %s '
+            'GROUP BY cart.user_id, item.ingredient_id',
+            (self.user_start,),
+        )
+        self.stdout.write(
+            f'{ShoppingCartIngredient._meta.verbose_name_plural}: '
+            f'{self.cursor.rowcount}'
+        )
+
+    def build_feeds(self):
+        """Раскладывает новые рецепты по лентам подписчиков.
+
+        Подписки считаются оформленными после публикации рецептов,
+        поэтому в ленту попадают последние рецепты автора, как при
+        подписке.
+        """
+        popular_authors = (
+            Subscription.objects.order_by().values('author')
+            .annotate(followers=Count('pk'))
+            .filter(followers__gt=FEED_FANOUT_MAX_FOLLOWERS)
+            .values('author')
+        )
+        Recipe.objects.filter(pk__gte=self.recipe_start).exclude(
+            author__in=popular_authors
+        ).update(fanned_out=True)
+        quote_name = connection.ops.quote_name
+        self.cursor.execute(
+            f'INSERT INTO {quote_name(FeedItem._meta.db_table)} '
+            '(user_id, recipe_id) '
+            'SELECT subscription.user_id, recipe.id '
+            'FROM (SELECT id, author_id, ROW_NUMBER() OVER ('
+            'PARTITION BY author_id ORDER BY id DESC) AS position '
+            f'FROM {quote_name(Recipe._meta.db_table)} '
+            'WHERE id >= %s AND fanned_out) recipe '
+            f'JOIN {quote_name(Subscription._meta.db_table)} subscription '
+            'ON subscription.author_id = recipe.author_id '
+            'WHERE recipe.position <= %s',
+            (self.recipe_start, FEED_BACKFILL_SIZE),
+        )
+        self.stdout.write(
+            f'{FeedItem._meta.verbose_name_plural}: {self.cursor.rowcount}'
+        )
+
+    def update_search_vectors(self):
+        batch_size = self.options['batch_size']
+        end = self.recipe_start + self.options['recipes']
+        for start in range(self.recipe_start, end, batch_size):
+            Recipe.objects.filter(
+                pk__gte=start, pk__lt=min(start + batch_size, end)
+            ).update_search_vector()
@@ -1,15 +1,22 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce, Greatest, Now
 
 from api.constants import (COOKING_TIME_MAX_MESSAGE, COOKING_TIME_MAX_VALUE,
                            COOKING_TIME_MIN_MESSAGE, COOKING_TIME_MIN_VALUE,
+                           FEED_BACKFILL_SIZE, FEED_FANOUT_MAX_FOLLOWERS,
                            INGREDIENT_NAME_MAX_LENGTH,
                            INGREDIENTS_AMOUNT_ERROR_MESSAGE,
                            INGREDIENTS_MIN_AMOUNT, MEASUREMENT_UNIT_MAX_LENGTH,
-                           RECIPE_NAME_MAX_LENGTH, SLUG_ERROR_MESSAGE,
-                           TAG_NAME_MAX_LENGTH, TAG_SLUG_MAX_LENGTH)
+                           PAGE_SIZE, RECIPE_NAME_MAX_LENGTH, SEARCH_CONFIG,
+                           SLUG_ERROR_MESSAGE, TAG_NAME_MAX_LENGTH,
+                           TAG_SLUG_MAX_LENGTH)
+from users.models import Subscription
 
 User = get_user_model()
 
@@ -70,6 +77,96 @@ class Ingredient(models.Model):
         return f'{self.name}({self.measurement_unit})'
 
 
+def count_by_recipe(model):
+    """Подзапрос с количеством записей модели для каждого рецепта."""
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(recipe=models.OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(count=models.Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов для рецептов."""
+
+    def with_user_flags(self, user):
+        """Добавляет признаки is_favorited и is_in_shopping_cart."""
+        if user is None or not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(recipe=models.OuterRef('pk'),
+                                        user=user)
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(recipe=models.OuterRef('pk'),
+                                            user=user)
+            ),
+        )
+
+    def change_count(self, field, delta):
+        """Изменяет счётчик рецептов набора, не опуская его ниже нуля."""
+        return self.update(**{field: Greatest(models.F(field) + delta, 0)})
+
+    def reconcile_counters(self):
+        """Исправляет счётчики избранного и корзин, разошедшиеся с данными.
+
+        Возвращает количество исправленных рецептов.
+        """
+        drifted = self.annotate(
+            actual_favorites_count=count_by_recipe(Favorite),
+            actual_in_carts_count=count_by_recipe(ShoppingCart),
+        ).exclude(
+            favorites_count=models.F('actual_favorites_count'),
+            in_carts_count=models.F('actual_in_carts_count'),
+        )
+        return self.model.objects.filter(
+            pk__in=drifted.values('pk')
+        ).update(
+            favorites_count=count_by_recipe(Favorite),
+            in_carts_count=count_by_recipe(ShoppingCart),
+        )
+
+    def touch(self):
+        """Увеличивает версию рецептов набора и обновляет время изменения."""
+        return self.update(
+            version=models.F('version') + 1, updated_at=Now()
+        )
+
+    def update_search_vector(self):
+        """Пересчитывает поисковый вектор рецептов набора.
+
+        В вектор входят название рецепта, названия его ингредиентов
+        и описание с убывающим весом.
+        """
+        ingredient_names = (
+            RecipeIngredient.objects.filter(recipe=models.OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(names=StringAgg('ingredient__name', delimiter=' '))
+            .values('names')
+        )
+        return self.update(
+            search_vector=(
+                SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector(
+                    models.Subquery(ingredient_names),
+                    weight='B',
+                    config=SEARCH_CONFIG,
+                )
+                + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+            )
+        )
+
+
 class Recipe(models.Model):
     """Модель для представления рецептов."""
 
@@ -95,6 +192,12 @@ class Recipe(models.Model):
         verbose_name='Фото блюда',
         upload_to='media/recipies/'
     )
+    image_variants = models.JSONField(
+        verbose_name='Варианты фото блюда',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     author = models.ForeignKey(
         User,
         verbose_name='Автор рецепта',
@@ -112,15 +215,78 @@ class Recipe(models.Model):
         related_name='recipes',
         through='RecipeIngredient'
     )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    version = models.PositiveIntegerField(
+        verbose_name='Версия',
+        default=1,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False,
+    )
+    fanned_out = models.BooleanField(
+        verbose_name='Разложен по лентам подписчиков',
+        default=False,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-id']
+        indexes = (
+            GinIndex(
+                fields=('search_vector',),
+                name='recipe_search_vector_idx',
+            ),
+            GinIndex(
+                fields=('name',),
+                name='recipe_name_trgm_idx',
+                opclasses=('gin_trgm_ops',),
+            ),
+            models.Index(
+                fields=('-favorites_count', '-in_carts_count', '-id'),
+                name='recipe_popular_idx',
+            ),
+            models.Index(
+                fields=('author', '-id'),
+                name='recipe_pull_feed_idx',
+                condition=models.Q(fanned_out=False),
+            ),
+        )
 
     def __str__(self):
         return self.name
 
+    def save_editable(self):
+        """Сохраняет изменённый рецепт без служебных полей.
+
+        Счётчики, варианты фото и отметка о раскладке по лентам меняются
+        отдельными запросами, и полное сохранение вернуло бы им значения,
+        прочитанные при загрузке рецепта.
+        """
+        self.save(update_fields=[
+            field.name for field in self._meta.concrete_fields
+            if field.editable and not field.primary_key
+        ])
+
 
 class RecipeIngredient(models.Model):
     """Промежуточная модель для связи рецептов и ингредиентов."""
@@ -161,6 +327,32 @@ class RecipeIngredient(models.Model):
         return f'{self.ingredient} в составе {self.recipe}'
 
 
+class UserRecipeQuerySet(models.QuerySet):
+    """Набор запросов для рецептов в избранном и корзинах покупок."""
+
+    def add_recipes(self, user, recipe_ids):
+        """Добавляет пользователю существующие рецепты из recipe_ids.
+
+        Уже добавленные рецепты пропускаются на уровне базы, поэтому
+        при параллельных запросах каждая запись вставляется один раз.
+        Возвращает множество id действительно добавленных рецептов.
+        """
+        if not recipe_ids:
+            return set()
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote_name(self.model._meta.db_table)} '
+                '(user_id, recipe_id, created) '
+                'SELECT %s, id, NOW() '
+                f'FROM {quote_name(Recipe._meta.db_table)} '
+                'WHERE id = ANY(%s) '
+                'ON CONFLICT DO NOTHING RETURNING recipe_id',
+                (user.pk, list(recipe_ids)),
+            )
+            return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
 class Favorite(models.Model):
     """Модель для избранных рецептов."""
 
@@ -176,6 +368,13 @@ class Favorite(models.Model):
         related_name='favorite',
         on_delete=models.CASCADE
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
+
+    objects = UserRecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'избранный'
@@ -207,6 +406,13 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
         on_delete=models.CASCADE
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
+
+    objects = UserRecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'список покупок'
@@ -221,3 +427,273 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.recipe} в списке покупок у {self.recipe}'
+
+
+class RecipeTrend(models.Model):
+    """Модель места рецепта в рейтинге популярных.
+
+    Заполняется периодически командой compute_trending, чтобы не
+    агрегировать избранное и корзины при каждом запросе.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='trend',
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    score = models.FloatField(
+        verbose_name='Популярность',
+    )
+    rank = models.PositiveIntegerField(
+        verbose_name='Место',
+        unique=True,
+    )
+
+    class Meta:
+        verbose_name = 'популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+        ordering = ['rank']
+
+    def __str__(self):
+        return f'{self.rank}. {self.recipe}'
+
+
+class ShoppingCartIngredientQuerySet(models.QuerySet):
+    """Набор запросов для суммарных ингредиентов списков покупок."""
+
+    def _apply_recipes(self, recipes, user_ids, sign):
+        if not recipes or not user_ids:
+            return
+        recipe_ingredients = RecipeIngredient.objects.filter(
+            recipe__in=recipes
+        ).order_by()
+        if sign > 0:
+            ingredient_ids = set(
+                recipe_ingredients.values_list('ingredient_id', flat=True)
+            )
+            self.bulk_create(
+                (
+                    self.model(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=0,
+                    )
+                    for user_id in user_ids
+                    for ingredient_id in ingredient_ids
+                ),
+                ignore_conflicts=True,
+            )
+        recipes_amount = (
+            recipe_ingredients.filter(ingredient=models.OuterRef('ingredient'))
+            .values('ingredient')
+            .annotate(total_amount=models.Sum('amount'))
+            .values('total_amount')
+        )
+        items = self.filter(
+            user_id__in=user_ids,
+            ingredient__in=recipe_ingredients.values('ingredient'),
+        )
+        items.update(
+            amount=Greatest(
+                models.F('amount') + sign * models.Subquery(recipes_amount),
+                0,
+            )
+        )
+        if sign < 0:
+            items.filter(amount__lte=0).delete()
+
+    def add_recipes(self, recipes, user_ids):
+        """Добавляет ингредиенты рецептов в списки покупок пользователей."""
+        self._apply_recipes(recipes, user_ids, 1)
+
+    def remove_recipes(self, recipes, user_ids):
+        """Вычитает ингредиенты рецептов из списков покупок пользователей."""
+        self._apply_recipes(recipes, user_ids, -1)
+
+    def add_recipe(self, recipe, user_ids):
+        """Добавляет ингредиенты рецепта в списки покупок пользователей."""
+        self.add_recipes((recipe,), user_ids)
+
+    def remove_recipe(self, recipe, user_ids):
+        """Вычитает ингредиенты рецепта из списков покупок пользователей."""
+        self.remove_recipes((recipe,), user_ids)
+
+    def aggregate_from_carts(self, user_ids=None):
+        """Считает суммы ингредиентов по корзинам покупок заново.
+
+        Возвращает словарь {(user_id, ingredient_id): amount}.
+        """
+        # Одно условие на корзину, иначе каждый вызов filter() добавит
+        # своё соединение и суммы умножатся на число корзин с рецептом.
+        if user_ids is None:
+            carts = {'recipe__shopping_cart__isnull': False}
+        else:
+            carts = {'recipe__shopping_cart__user_id__in': user_ids}
+        recipe_ingredients = RecipeIngredient.objects.filter(**carts)
+        totals = (
+            recipe_ingredients.order_by()
+            .values_list('recipe__shopping_cart__user_id', 'ingredient_id')
+            .annotate(total_amount=models.Sum('amount'))
+        )
+        return {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount in totals
+        }
+
+    def rebuild(self, user_ids):
+        """Пересобирает списки покупок пользователей по их корзинам."""
+        self.filter(user_id__in=user_ids).delete()
+        self.bulk_create(
+            self.model(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for (user_id, ingredient_id), amount
+            in self.aggregate_from_carts(user_ids).items()
+        )
+
+
+class ShoppingCartIngredient(models.Model):
+    """Модель суммарного количества ингредиента в списке покупок.
+
+    Поддерживается в актуальном состоянии при изменении корзины покупок
+    и состава рецептов, чтобы не суммировать ингредиенты при выгрузке.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='shopping_list',
+        on_delete=models.CASCADE
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        related_name='shopping_list',
+        on_delete=models.CASCADE
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+    )
+
+    objects = ShoppingCartIngredientQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        ordering = ['user']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} в списке покупок у {self.user}'
+
+
+class FeedItemQuerySet(models.QuerySet):
+    """Набор запросов для лент рецептов от авторов из подписок."""
+
+    def fan_out(self, recipe_id, author_id):
+        """Раскладывает рецепт по лентам подписчиков автора.
+
+        Рецепты авторов с большим числом подписчиков не раскладываются
+        и добавляются в ленту при чтении. Возвращает True, если рецепт
+        разложен.
+        """
+        follower_ids = list(
+            Subscription.objects.filter(author_id=author_id)
+            .values_list('user_id', flat=True)[:FEED_FANOUT_MAX_FOLLOWERS + 1]
+        )
+        if len(follower_ids) > FEED_FANOUT_MAX_FOLLOWERS:
+            return False
+        with transaction.atomic():
+            self.bulk_create(
+                (
+                    self.model(user_id=user_id, recipe_id=recipe_id)
+                    for user_id in follower_ids
+                ),
+                ignore_conflicts=True,
+            )
+            Recipe.objects.filter(pk=recipe_id).update(fanned_out=True)
+        return True
+
+    def backfill(self, user_id, author_id):
+        """Добавляет в ленту подписчика последние рецепты автора."""
+        recipe_ids = Recipe.objects.filter(
+            author_id=author_id, fanned_out=True
+        ).order_by('-id').values_list('id', flat=True)[:FEED_BACKFILL_SIZE]
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in recipe_ids
+            ),
+            ignore_conflicts=True,
+        )
+
+    def remove_author(self, user_id, author_id):
+        """Убирает из ленты пользователя рецепты автора."""
+        self.filter(user_id=user_id, recipe__author_id=author_id).delete()
+
+    def get_recipe_ids(self, user, before=None, limit=PAGE_SIZE):
+        """Возвращает id рецептов ленты по убыванию, меньшие before.
+
+        Объединяет разложенные рецепты из ленты пользователя и ещё
+        не разложенные рецепты авторов из его подписок.
+        """
+        fanned_out = self.filter(user=user)
+        pulled = Recipe.objects.filter(
+            author__following__user=user, fanned_out=False
+        )
+        if before is not None:
+            fanned_out = fanned_out.filter(recipe_id__lt=before)
+            pulled = pulled.filter(id__lt=before)
+        recipe_ids = set(
+            fanned_out.order_by('-recipe_id')
+            .values_list('recipe_id', flat=True)[:limit]
+        )
+        recipe_ids.update(
+            pulled.order_by('-id').values_list('id', flat=True)[:limit]
+        )
+        return sorted(recipe_ids, reverse=True)[:limit]
+
+
+class FeedItem(models.Model):
+    """Модель рецепта в ленте подписок пользователя.
+
+    Заполняется при создании рецепта, если у автора немного подписчиков.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='feed',
+        on_delete=models.CASCADE
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='feed_items',
+        on_delete=models.CASCADE
+    )
+
+    objects = FeedItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'рецепт ленты подписок'
+        verbose_name_plural = 'Ленты подписок'
+        ordering = ['user', '-recipe']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте у {self.user}'
@@ -1,12 +1,24 @@
+from admin_auto_filters.filters import AutocompleteFilter
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
 
+from api.pagination import EstimatedCountPaginator
 from users.models import Subscription
 
 User = get_user_model()
 
 
+class SubscriberFilter(AutocompleteFilter):
+    title = 'Подписчик'
+    field_name = 'user'
+
+
+class AuthorFilter(AutocompleteFilter):
+    title = 'Автор'
+    field_name = 'author'
+
+
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
     """Настройки панели администрирования пользователями."""
@@ -23,6 +35,8 @@ class CustomUserAdmin(UserAdmin):
     search_fields = ('email', 'first_name', 'last_name', 'username')
     ordering = ('username', )
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Subscription)
@@ -35,10 +49,13 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'author',
     )
     list_display_links = ('id', 'user')
-    list_filter = ('user', )
+    list_filter = (SubscriberFilter, AuthorFilter)
+    autocomplete_fields = ('user', 'author')
     search_fields = ('user__username', )
-    ordering = ('user', )
+    ordering = ('-id', )
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
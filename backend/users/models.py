@@ -49,6 +49,12 @@ class User(AbstractUser):
         upload_to='media/avatars/',
         blank=True,
     )
+    avatar_variants = models.JSONField(
+        verbose_name='Варианты аватара',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'пользователь'